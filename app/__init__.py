@@ -2,6 +2,7 @@ import sys
 
 if sys.version_info < (3, 11):
     raise RuntimeError("Python 3.11+ is required")
+import contextlib
 import dataclasses
 import logging
 import os
@@ -10,8 +11,11 @@ import urllib.parse
 from pathlib import Path
 
 import inspect
+import flask
 from flask import Flask, request, url_for, render_template
+import sqlalchemy as sa
 import werkzeug.utils
+from cachelib import FileSystemCache
 from flask_apscheduler import APScheduler
 from flask_assets import Bundle, Environment
 from flask_login import LoginManager
@@ -36,12 +40,9 @@ class App(Flask):
     def __init__(self):
         super().__init__(__name__)
 
-        self.data = data.load(".")
-        if links := self.data.get("links"):
-            if username := self.data["links"].get("instagram_username"):
-                links["instagram"] = f"https://instagram.com/{username}"
-            if username := self.data["links"].get("x_username"):
-                links["x"] = f"https://x.com/{username}"
+        self._data = (None, {})
+        if config.DATA_RELOAD_INTERVAL:
+            data.watch(config.DATA_RELOAD_INTERVAL)
 
         @self.context_processor
         def _():
@@ -61,6 +62,19 @@ class App(Flask):
                     request.path + "?" + urllib.parse.urlencode(without_empty)
                 )
 
+        @self.after_request
+        def _(response):
+            if session := flask.g.get("db_session"):
+                session.commit()
+            return response
+
+        @self.teardown_request
+        def _(exception):
+            if session := flask.g.pop("db_session", None):
+                if exception:
+                    session.rollback()
+                session.close()
+
         self.jinja_env.lstrip_blocks = True
         self.jinja_env.trim_blocks = True
 
@@ -102,19 +116,26 @@ class App(Flask):
 
         VAR_DIR.mkdir(exist_ok=True)
 
-        # Flask-SQLAlchemy is only used for the session backend. Codebase uses
-        # self-managed SQLAlchemy for the database.
-        self.config["SQLALCHEMY_DATABASE_URI"] = db.URI
-        FlaskSQLAlchemy = SQLAlchemy(self)
-
-        # self.config["SESSION_TYPE"] = "cachelib"
-        # self.config["SESSION_CACHELIB"] = FileSystemCache(
-        #     str(VAR_DIR / "flask_session"),
-        # )
         self.config["SESSION_USE_SIGNER"] = True
-        self.config["SESSION_TYPE"] = "sqlalchemy"
-        self.config["SESSION_SQLALCHEMY"] = FlaskSQLAlchemy
         self.config["SESSION_SERIALIZATION_FORMAT"] = "json"
+        if config.SESSION_BACKEND == "cachelib":
+            self.config["SESSION_TYPE"] = "cachelib"
+            self.config["SESSION_CACHELIB"] = FileSystemCache(
+                str(VAR_DIR / "flask_session"),
+            )
+        else:
+            # Flask-SQLAlchemy is only used for the session backend, with its
+            # own database so that sessions do not compete with writes to the
+            # application database. Codebase uses self-managed SQLAlchemy for
+            # the database.
+            self.config["SQLALCHEMY_DATABASE_URI"] = db.SESSIONS_URI
+            FlaskSQLAlchemy = SQLAlchemy(self)
+            with self.app_context():
+                sa.event.listen(
+                    FlaskSQLAlchemy.engine, "connect", db.set_pragmas
+                )
+            self.config["SESSION_TYPE"] = "sqlalchemy"
+            self.config["SESSION_SQLALCHEMY"] = FlaskSQLAlchemy
         self.cache = Session(self)
 
         secret_key_path = VAR_DIR / "secret_key.txt"
@@ -125,6 +146,28 @@ class App(Flask):
         if config.RUN_TASKS:
             self.scheduler.start()
 
+    @property
+    def data(self) -> dict:
+        """
+        Content of the data directory, from the current data snapshot. Hold a
+        reference to it rather than accessing it repeatedly if you need a
+        consistent view during data reloads.
+        """
+        snapshot, result = self._data
+        current = data.get_snapshot()
+        if snapshot is current:
+            return result
+
+        result = dict(current.view())
+        if links := result.get("links"):
+            links = result["links"] = dict(links)
+            if username := links.get("instagram_username"):
+                links["instagram"] = f"https://instagram.com/{username}"
+            if username := links.get("x_username"):
+                links["x"] = f"https://x.com/{username}"
+        self._data = (current, result)
+        return result
+
     def redirect(self, route, external=False, code=302):
         external = external or route.split(":")[0] in ("http", "https")
         if not external and not route.startswith("/"):
@@ -139,7 +182,17 @@ class App(Flask):
         return render_template(f"{template_name}.html.j2", **context)
 
     def session(self, **kwargs):
-        return db.session(**kwargs)
+        """
+        During a request, returns the session shared by the whole request,
+        which is committed after the response and closed at the end of the
+        request. Exiting a `with` block does not close it. Otherwise, or when
+        passing options, returns a new session.
+        """
+        if kwargs or not flask.has_request_context():
+            return db.session(**kwargs)
+        if "db_session" not in flask.g:
+            flask.g.db_session = db.session()
+        return contextlib.nullcontext(flask.g.db_session)
 
     def route(self, rule, **options):
         """
@@ -0,0 +1,23 @@
+import click
+
+from app import app, data
+
+
+@app.cli.group("data")
+def group():
+    pass
+
+
+@group.command()
+def build():
+    """Validate data files and compile them into a snapshot for fast startup"""
+    snapshot = data.parse()
+    errors = data.validate(snapshot)
+    if errors:
+        raise click.ClickException("Invalid data files:\n" + "\n".join(errors))
+
+    data.write_snapshot(snapshot)
+    print(
+        f"Compiled {len(snapshot.files)} data files to {data.SNAPSHOT_PATH}"
+        f" ({snapshot.hash[:12]})"
+    )
@@ -1,8 +1,17 @@
+import random
+import re
+import tempfile
+import threading
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+
 import alembic.command
 import click
+import sqlalchemy as sa
 from alembic.util import AutogenerateDiffsDetected
 
-from app import app, db
+from app import app, config, db
 
 
 @app.cli.group("db")
@@ -22,3 +31,143 @@ def migration(name=None):
         return
     name = " ".join(name)
     alembic.command.revision(db.alembic_cfg, autogenerate=True, message=name)
+
+
+def run_benchmark(path: Path, pragmas: dict, seconds, readers, writers):
+    engine = db.create_engine(f"sqlite:///{path}", pragmas=pragmas)
+    db.Table.metadata.create_all(engine)
+    users_count = 1000
+    with db.Session(bind=engine) as s:
+        s.add_all(db.User(login=f"user{i}") for i in range(users_count))
+        s.commit()
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(write: bool):
+        done = errors = 0
+        while time.monotonic() < deadline:
+            id = random.randint(1, users_count)
+            try:
+                with db.Session(bind=engine) as s:
+                    if write:
+                        s.execute(
+                            sa.update(db.User)
+                            .where(db.User.id == id)
+                            .values(last_seen=datetime.now(UTC))
+                        )
+                        s.commit()
+                    else:
+                        s.get(db.User, id).games
+                done += 1
+            except sa.exc.OperationalError:
+                errors += 1
+        with lock:
+            counts["writes" if write else "reads"] += done
+            counts["errors"] += errors
+
+    threads = [
+        threading.Thread(target=worker, args=(i < writers,))
+        for i in range(readers + writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return counts
+
+
+@group.command()
+@click.option("--seconds", default=5.0, help="Duration of each run")
+@click.option("--readers", default=8, help="Reading threads")
+@click.option("--writers", default=2, help="Writing threads")
+def benchmark(seconds, readers, writers):
+    """
+    Compare concurrent reads and writes throughput on a scratch database with
+    SQLite defaults and with SQLITE_PRAGMAS.
+    """
+    profiles = {"defaults": {}, "SQLITE_PRAGMAS": config.SQLITE_PRAGMAS}
+    for name, pragmas in profiles.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            counts = run_benchmark(
+                Path(tmp) / "benchmark.db", pragmas, seconds, readers, writers
+            )
+        print(
+            f"{name}: {counts['reads'] / seconds:.0f} reads/s,"
+            f" {counts['writes'] / seconds:.0f} writes/s,"
+            f" {counts['errors']} errors"
+        )
+
+
+def get_hot_queries() -> dict[str, sa.Select]:
+    """Queries run on most requests or logins, keyed by where they come from"""
+    from app.services import search
+
+    User, UserGame = db.User, db.UserGame
+    public = User.hide_in_list.is_(False)
+    matches = search.match("login").subquery()
+    return {
+        "user.get_by_login": sa.select(User).where(
+            sa.func.lower(User.login) == "login"
+        ),
+        "routes.user": sa.select(User).where(User.login == "login"),
+        "discord.get_db_user (discord_id)": sa.select(User).where(
+            User.discord_id == "0"
+        ),
+        "discord.get_db_user (email)": sa.select(User).where(
+            User.email == "user@example.com"
+        ),
+        "routes.users": sa.select(User).where(public),
+        "routes.users (game)": sa.select(User).where(
+            public, User.games.any(UserGame.game_id == 1)
+        ),
+        "routes.map": sa.select(User).where(
+            public, User.map_point_id.isnot(None)
+        ),
+        "avatar.delete_if_unused": sa.select(sa.func.count())
+        .select_from(User)
+        .where(User.image == "hash"),
+        "games.get_members": sa.select(UserGame).where(UserGame.game_id == 1),
+        "routes.users (name)": sa.select(User).where(
+            public, User.id.in_(sa.select(matches.c.rowid))
+        ),
+    }
+
+
+# "SCAN users" reads the whole table, "SCAN users USING INDEX ..." does not
+FULL_SCAN = re.compile(r"^SCAN \w+$")
+
+
+@group.command()
+def reindex():
+    """Rebuild the users full-text search index"""
+    from app.services import search
+
+    search.rebuild()
+
+
+@group.command()
+def explain():
+    """
+    Print the query plan of hot queries, fails if one of them needs a full
+    table scan, usually because an index is missing.
+    """
+    scans = []
+    with db.engine.connect() as connection:
+        for name, statement in get_hot_queries().items():
+            sql = statement.compile(
+                db.engine, compile_kwargs={"literal_binds": True}
+            )
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")
+            print(name)
+            for row in plan:
+                detail = row[-1]
+                print(f"  {detail}")
+                if FULL_SCAN.match(detail):
+                    scans.append(f"{name}: {detail}")
+    if scans:
+        raise click.ClickException(
+            "Full table scans found:\n" + "\n".join(scans)
+        )
@@ -36,6 +36,7 @@ def avatar(login):
 def import_games():
     """Import Discord members game roles to games lists"""
     users = service.import_games_lists()
+    print("Discord API:", service.pop_rate_limit_stats())
     if not users:
         print("No change.")
         return
@@ -46,14 +47,23 @@ def import_games():
 def create():
     """Create Discord roles using games data files"""
     api = service.API(config.DISCORD_BOT_TOKEN)
-    server = api.get_server()
+    guild = service.get_guild()
     games_ = games.get_all()
-    roles_to_create = [x.name for x in games_ if not server.get_role(x.name)]
+    roles_to_create = [x.name for x in games_ if not guild.get_role(x.name)]
 
     print("Will create Discord roles:", roles_to_create)
     if not click.confirm("Continue?"):
         return
 
     for name in roles_to_create:
-        api.create_role(server.id, name=name)
+        api.create_role(guild.id, name=name)
         print("Created role", name)
+    if roles_to_create:
+        service.guild_cache.invalidate()
+    print("Discord API:", service.pop_rate_limit_stats())
+
+
+@discord.command("invalidate")
+def invalidate():
+    """Forget the cached Discord server and roles"""
+    service.guild_cache.invalidate()
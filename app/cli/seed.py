@@ -14,9 +14,7 @@ def roles_():
     """Create game data files and populate db using existing Discord roles"""
     path = data.resolve("games")
     path.mkdir(exist_ok=True)
-    api = discord.API(config.DISCORD_BOT_TOKEN)
-    server = api.get_server()
-    role_names = [x.name for x in server.roles]
+    role_names = [x.name for x in discord.get_guild().roles]
     created = []
 
     if "=== GAMES ===" in role_names:
@@ -159,24 +157,21 @@ def popular(limit):
     """Update popular bool based on Discord roles"""
     api = discord.API(config.DISCORD_BOT_TOKEN)
     members = api.get_members()
-    roles_by_id = {role.id: role.name for role in api.get_server().roles}
+    guild = discord.get_guild()
     roles_count = {}
     for member in members:
         for role_id in member["roles"]:
-            role_name = roles_by_id.get(role_id)
-            roles_count.setdefault(role_name, 0)
-            roles_count[role_name] += 1
+            if role_id in guild.games_by_role:
+                roles_count.setdefault(role_id, 0)
+                roles_count[role_id] += 1
 
     top_roles = []
-    for role, _ in sorted(
+    for role_id, _ in sorted(
         roles_count.items(), key=lambda x: x[1], reverse=True
     ):
         if limit == 0:
             break
-        game = games.get_by_name(role)
-        if not game:
-            continue
-        top_roles.append(game)
+        top_roles.append(guild.get_game(role_id))
         limit -= 1
 
     updated = 0
@@ -195,16 +190,21 @@ def popular(limit):
 
 
 @seed.command("gps")
-def gps_():
+@click.option(
+    "--refresh", is_flag=True, help="Download the vendored datasets again"
+)
+def gps_(refresh):
     """Populate database with departments and countries"""
-    created = gps.populate_departments()
-    print("Created", len(created), "departments")
-    created = gps.populate_countries()
-    print("Created", len(created), "countries")
+    if refresh:
+        gps.refresh_geodata()
+        print("Downloaded datasets to", gps.GEODATA_DIR)
+    print("Created", gps.load_map_points(), "map points")
+    for level in gps.build_regions_topology()["levels"]:
+        print("Built", level["file"], "from zoom", level["min_zoom"])
 
 
 @seed.command("regions")
 def regions_():
-    """Download regions topology"""
-    gps.create_regions_topology(force=True)
-    print("Downloaded regions topology")
+    """Simplify and compress the vendored regions"""
+    for level in gps.build_regions_topology()["levels"]:
+        print("Built", level["file"], "from zoom", level["min_zoom"])
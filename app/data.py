@@ -1,30 +1,315 @@
+import dataclasses
 import functools
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+import typing as t
+from dataclasses import dataclass
 from pathlib import Path
 
 import ruamel.yaml
 import sssimp.generators.data
 from sssimp.generators.markdown import markdown_to_html
 
+from app import VAR_DIR
+
 # ruaeml.yaml is a YAML parser that preserves comments and formatting.
 # Use this one instead of pyyaml when you need to write YAML files that may also
 # be edited by humans.
 yaml = ruamel.yaml.YAML()
 yaml.indent(mapping=2, sequence=4, offset=2)
 
+DATA_DIR = Path("data")
+SNAPSHOT_PATH = VAR_DIR / "data.pickle"
+# Bump when the structure of Snapshot changes to invalidate existing files
+SNAPSHOT_FORMAT = 2
+# Values of these keys in data files are rendered as Markdown by templates
+MARKDOWN_KEYS = ("description", "description_short")
+
 
 def resolve(path: str):
-    return Path("data") / path
+    return DATA_DIR / path
+
+
+@dataclass
+class Snapshot:
+    """
+    Parsed content of every data file, keyed by path relative to `DATA_DIR`.
+    `hash` identifies the sources it was compiled from, see `get_hash`.
+    """
+
+    hash: str
+    files: dict[str, t.Any]
+    # Pre-rendered HTML of Markdown values from MARKDOWN_KEYS, by raw text
+    markdown: dict[str, str] = dataclasses.field(default_factory=dict)
+    # Set when the snapshot becomes the current one, increases on each reload
+    version: int = 0
+
+    def __post_init__(self):
+        self._views = {}
+
+    def __getstate__(self):
+        return {
+            "hash": self.hash,
+            "files": self.files,
+            "markdown": self.markdown,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def view(self, path: str = ".", flat=False) -> dict:
+        """
+        Same structure as what sssimp would return when loading `path`.
+        Views are computed once per snapshot and shared, do not mutate them.
+        """
+        key = (path, flat)
+        if key not in self._views:
+            self._views[key] = self._view(path, flat)
+        return self._views[key]
+
+    def _view(self, path: str, flat: bool) -> dict:
+        prefix = Path(path).parts
+        result = {}
+        for name, content in self.files.items():
+            parts = Path(name).parts
+            if parts[: len(prefix)] != prefix:
+                continue
+            parts = parts[len(prefix) :]
+            if flat:
+                result[Path(name).stem] = content
+                continue
+            target = result
+            for parent in parts[:-1]:
+                target = target.setdefault(parent.split(".")[0], {})
+            target[parts[-1].split(".")[0]] = content
+        return result
+
+
+def get_sources() -> list[Path]:
+    return sorted(DATA_DIR.rglob("*.*"), key=str)
+
+
+def get_hash() -> str:
+    """Content hash of all files in the data directory"""
+    digest = hashlib.sha256(str(SNAPSHOT_FORMAT).encode())
+    for file in get_sources():
+        digest.update(file.relative_to(DATA_DIR).as_posix().encode())
+        digest.update(b"\0")
+        digest.update(hashlib.sha256(file.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+def render_markdown(content, result: dict[str, str]):
+    """Renders values of MARKDOWN_KEYS found in `content` into `result`"""
+    if isinstance(content, list):
+        for item in content:
+            render_markdown(item, result)
+    if not isinstance(content, dict):
+        return
+    for key, value in content.items():
+        if key in MARKDOWN_KEYS and isinstance(value, str):
+            if value not in result:
+                result[value] = markdown_to_html(value).html
+            continue
+        render_markdown(value, result)
+
+
+def parse() -> Snapshot:
+    """Parse every data file using sssimp"""
+    hash = get_hash()
+    files = {}
+    for file in get_sources():
+        parser = sssimp.generators.data.Data(base_path=DATA_DIR)
+        parser.handle_file(file)
+        if file.stem in parser.flat:
+            files[file.relative_to(DATA_DIR).as_posix()] = parser.flat[
+                file.stem
+            ]
+    html = {}
+    render_markdown(list(files.values()), html)
+    return Snapshot(hash=hash, files=files, markdown=html)
+
+
+def read_snapshot(path: Path = SNAPSHOT_PATH) -> Snapshot | None:
+    try:
+        with path.open("rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable data snapshot {path}: {e}")
+        return None
+    if not isinstance(snapshot, Snapshot):
+        return None
+    return snapshot
+
+
+def write_snapshot(snapshot: Snapshot, path: Path = SNAPSHOT_PATH):
+    """Atomically replaces the snapshot file, safe with concurrent workers"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(path)
+
+
+_current: Snapshot = None
+_version = 0
+_lock = threading.RLock()
+_listeners: list[t.Callable[[Snapshot], None]] = []
+_validators: list[t.Callable[[Snapshot], list[str]]] = []
+
+
+def _swap(snapshot: Snapshot):
+    global _current, _version
+    _version += 1
+    snapshot.version = _version
+    # Single assignment, readers either get the previous or the new snapshot
+    _current = snapshot
+
+
+def _load() -> Snapshot:
+    """
+    Compiled snapshot if it is up to date with the data files, otherwise parse
+    them and try to save the result for the next processes.
+    """
+    hash = get_hash()
+    snapshot = read_snapshot()
+    if snapshot and snapshot.hash == hash:
+        return snapshot
+
+    logging.info("Data snapshot is missing or outdated, parsing data files")
+    snapshot = parse()
+    try:
+        write_snapshot(snapshot)
+    except Exception as e:
+        logging.warning(f"Could not save data snapshot: {e}")
+    return snapshot
+
+
+def get_snapshot() -> Snapshot:
+    if _current is None:
+        with _lock:
+            if _current is None:
+                _swap(_load())
+    return _current
+
+
+def get_version() -> int:
+    """Version of the current snapshot, to be used as a key by caches"""
+    return get_snapshot().version
+
+
+def on_reload(func: t.Callable[[Snapshot], None]):
+    """Registers `func` to be called with the new snapshot after a reload"""
+    _listeners.append(func)
+    return func
+
+
+def validator(func: t.Callable[[Snapshot], list[str]]):
+    """
+    Registers `func` to check snapshots before they are used, it returns the
+    errors of each invalid file
+    """
+    _validators.append(func)
+    return func
+
+
+def validate(snapshot: Snapshot) -> list[str]:
+    errors = []
+    for func in _validators:
+        try:
+            errors.extend(func(snapshot))
+        except Exception as e:
+            errors.append(f"{func.__module__}: {e!r}")
+    return errors
+
+
+def reload(force=False) -> bool:
+    """
+    Parse the data files again and swap the current snapshot if they changed
+    and are valid. Requests being processed keep using the snapshot they
+    already got.
+    """
+    with _lock:
+        current = get_snapshot()
+        if not force and get_hash() == current.hash:
+            return False
+        snapshot = parse()
+        if errors := validate(snapshot):
+            logging.error(
+                "Invalid data files, keeping the previous ones:\n"
+                + "\n".join(errors)
+            )
+            return False
+        _swap(snapshot)
+    logging.info(f"Reloaded data files, version {snapshot.version}")
+
+    for listener in _listeners:
+        try:
+            listener(snapshot)
+        except Exception:
+            logging.exception(f"Data reload listener {listener} failed")
+
+    try:
+        write_snapshot(snapshot)
+    except Exception as e:
+        logging.warning(f"Could not save data snapshot: {e}")
+    return True
+
+
+class Watcher(threading.Thread):
+    """Polls the data files modification times and reloads them on change"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="data-watcher", daemon=True)
+        self.interval = interval
+
+    @staticmethod
+    def get_signature() -> list[tuple[str, int, int]]:
+        result = []
+        for file in get_sources():
+            stat = file.stat()
+            result.append((str(file), stat.st_mtime_ns, stat.st_size))
+        return result
+
+    def run(self):
+        signature = self.get_signature()
+        while True:
+            time.sleep(self.interval)
+            try:
+                current = self.get_signature()
+                if current == signature:
+                    continue
+                # Do not retry invalid files until they are modified again
+                signature = current
+                reload()
+            except Exception:
+                logging.exception("Could not reload data files")
+
+
+_watcher: Watcher = None
+
+
+def watch(interval: float):
+    global _watcher
+    with _lock:
+        if _watcher is None:
+            _watcher = Watcher(interval)
+            _watcher.start()
 
 
-@functools.cache
 def load(path: str, flat=False) -> dict:
     """
     Load data from a path in the data directory.
     Use flat=True to get a single level dictionary instead of one that mirrors
     the directory structure.
     """
-    path = resolve(path)
-    return sssimp.generators.data.get(path, flat=flat)
+    return get_snapshot().view(path, flat=flat)
 
 
 @functools.cache
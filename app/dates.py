@@ -0,0 +1,45 @@
+"""
+Memoized date rendering. Arrow's locale machinery is slow enough to show up
+when rendering long lists of events or members, and most strings only depend
+on the date, the locale, and for relative ones, the current minute.
+"""
+
+import functools
+import time
+from datetime import date, datetime
+
+import arrow
+
+from app import config
+
+# Relative strings are computed against the start of the current minute,
+# except for recent values whose seconds and tense depend on the exact time
+BUCKET_SECONDS = 60
+
+
+@functools.lru_cache(maxsize=4096)
+def get(value: date | datetime) -> arrow.Arrow:
+    return arrow.get(value)
+
+
+@functools.lru_cache(maxsize=4096)
+def format(value: date | datetime, fmt: str, locale: str = None) -> str:
+    return get(value).format(fmt, locale=locale or config.LANG)
+
+
+@functools.lru_cache(maxsize=4096)
+def _humanize(value: date | datetime, bucket: int, locale: str) -> str:
+    now = arrow.Arrow.utcfromtimestamp(bucket * BUCKET_SECONDS)
+    return get(value).humanize(now, locale=locale)
+
+
+def humanize(value: date | datetime, locale: str = None) -> str:
+    now = time.time()
+    bucket = int(now // BUCKET_SECONDS)
+    locale = locale or config.LANG
+    timestamp = get(value).timestamp()
+    if (bucket - 1) * BUCKET_SECONDS <= timestamp <= now:
+        return get(value).humanize(
+            arrow.Arrow.utcfromtimestamp(now), locale=locale
+        )
+    return _humanize(value, bucket, locale)
@@ -13,13 +13,40 @@ from sqlalchemy.orm import Session
 from sqlalchemy.orm import declarative_mixin as mixin
 from sqlalchemy.orm import mapped_column as column
 
-from app import VAR_DIR
+from app import VAR_DIR, config
 
 URI = f"sqlite:///{VAR_DIR / 'app.db'}"
+SESSIONS_URI = f"sqlite:///{VAR_DIR / 'sessions.db'}"
 alembic_cfg = Config("alembic.ini")
 
+
+def set_pragmas(dbapi_connection, connection_record=None, pragmas=None):
+    """
+    Applies SQLITE_PRAGMAS, or `pragmas`, to a new SQLite connection. Can be
+    used as a "connect" event listener.
+    """
+    if pragmas is None:
+        pragmas = config.SQLITE_PRAGMAS
+    cursor = dbapi_connection.cursor()
+    for key, value in pragmas.items():
+        cursor.execute(f"PRAGMA {key} = {value}")
+    cursor.close()
+
+
+def create_engine(uri: str = URI, pragmas: dict = None, **kwargs):
+    kwargs.setdefault("pool_size", config.SQLITE_POOL_SIZE)
+    kwargs.setdefault("max_overflow", config.SQLITE_POOL_OVERFLOW)
+    result = sa.create_engine(uri, **kwargs)
+    sa.event.listen(
+        result,
+        "connect",
+        lambda *args: set_pragmas(*args, pragmas=pragmas),
+    )
+    return result
+
+
 try:
-    engine = sa.create_engine(URI)
+    engine = create_engine()
 except ModuleNotFoundError as e:
     raise Exception(
         f"{e}"
@@ -105,4 +132,4 @@ from .game import Game  # noqa: E402 F401
 from .map_points import MapPoint  # noqa: E402 F401
 from .relationships.arcade_game import ArcadeGame  # noqa: E402 F401
 from .relationships.user_game import UserGame  # noqa: E402 F401
-from .user import User  # noqa: E402 F401
+from .user import User, UserSearch  # noqa: E402 F401
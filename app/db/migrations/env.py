@@ -85,6 +85,9 @@ def run_migrations_online() -> None:
     def include_name(name, type_, parent_names):
         if name in ("sessions",):
             return False
+        # FTS5 virtual table and its shadow tables, see db.UserSearch
+        if type_ == "table" and name.startswith("users_search"):
+            return False
         return True
 
     with connectable.connect() as connection:
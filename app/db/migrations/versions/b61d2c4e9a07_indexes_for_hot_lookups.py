@@ -0,0 +1,58 @@
+"""Indexes for hot lookups
+
+Revision ID: b61d2c4e9a07
+Revises: 7c8467fc62bf
+Create Date: 2026-10-17 12:40:12.481530
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b61d2c4e9a07"
+down_revision: Union[str, None] = "7c8467fc62bf"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("user_games", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_user_games_game_id"), ["game_id"], unique=False
+        )
+
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_users_discord_id"), ["discord_id"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_users_email"), ["email"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_users_hide_in_list"), ["hide_in_list"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_users_image"), ["image"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_users_map_point_id"), ["map_point_id"], unique=False
+        )
+        batch_op.create_index(
+            "ix_users_login_lower", [sa.text("lower(login)")], unique=False
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.drop_index("ix_users_login_lower")
+        batch_op.drop_index(batch_op.f("ix_users_map_point_id"))
+        batch_op.drop_index(batch_op.f("ix_users_image"))
+        batch_op.drop_index(batch_op.f("ix_users_hide_in_list"))
+        batch_op.drop_index(batch_op.f("ix_users_email"))
+        batch_op.drop_index(batch_op.f("ix_users_discord_id"))
+
+    with op.batch_alter_table("user_games", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_user_games_game_id"))
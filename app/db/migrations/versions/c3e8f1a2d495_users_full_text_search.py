@@ -0,0 +1,55 @@
+"""Users full-text search
+
+Revision ID: c3e8f1a2d495
+Revises: b61d2c4e9a07
+Create Date: 2026-10-17 14:05:37.204918
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import unidecode
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c3e8f1a2d495"
+down_revision: Union[str, None] = "b61d2c4e9a07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def normalize(text):
+    return unidecode.unidecode(text or "").lower()
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE VIRTUAL TABLE users_search"
+        " USING fts5(login, display_name, bio, tokenize='trigram')"
+    )
+    connection = op.get_bind()
+    users = connection.execute(
+        sa.text("SELECT id, login, display_name, bio FROM users")
+    )
+    rows = [
+        {
+            "id": id,
+            "login": normalize(login),
+            "display_name": normalize(display_name),
+            "bio": normalize(bio),
+        }
+        for id, login, display_name, bio in users
+    ]
+    if rows:
+        connection.execute(
+            sa.text(
+                "INSERT INTO users_search (rowid, login, display_name, bio)"
+                " VALUES (:id, :login, :display_name, :bio)"
+            ),
+            rows,
+        )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE users_search")
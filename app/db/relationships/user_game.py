@@ -10,7 +10,7 @@ if TYPE_CHECKING:
 
 class UserGame(Table):
     user_id = column(ForeignKey("users.id"), primary_key=True)
-    game_id = column(ForeignKey("games.id"), primary_key=True)
+    game_id = column(ForeignKey("games.id"), primary_key=True, index=True)
     favorite: Column[bool] = column(default=False)
 
     user: Column[User] = relation("User", back_populates="games")
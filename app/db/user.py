@@ -6,6 +6,8 @@ from typing import TYPE_CHECKING
 
 import flask
 from flask_login import UserMixin
+import sqlalchemy as sa
+from sqlalchemy import Index, func
 
 from . import Column, ForeignKey, Id, Table, Timed, column, relation
 
@@ -22,24 +24,24 @@ class User(Table, UserMixin, Id, Timed):
         discord = enum.auto()
 
     login: Column[str] = column(unique=True)
-    email: Column[str | None]
+    email: Column[str | None] = column(index=True)
     password: Column[str | None]
     display_name: Column[str | None]
     bio: Column[str | None]
-    image: Column[str | None]
+    image: Column[str | None] = column(index=True)
     image_type: Column[ImageType] = column(default=ImageType.empty)
     last_seen: Column[datetime | None]
 
-    discord_id: Column[str | None]
+    discord_id: Column[str | None] = column(index=True)
     discord_access_token: Column[str | None]
     discord_refresh_token: Column[str | None]
 
-    hide_in_list: Column[bool] = column(default=False)
+    hide_in_list: Column[bool] = column(default=False, index=True)
 
     games: Column[list[UserGame]] = relation(
         "UserGame", back_populates="user", cascade="all, delete-orphan"
     )
-    map_point_id = column(ForeignKey("map_points.id"))
+    map_point_id = column(ForeignKey("map_points.id"), index=True)
     map_point: Column[MapPoint] = relation("MapPoint", uselist=False)
 
     def __repr__(self):
@@ -85,3 +87,25 @@ class User(Table, UserMixin, Id, Timed):
         if fav_first:
             result.sort(key=lambda x: not self.favorited(x.slug))
         return result
+
+
+# Case-insensitive login lookups, see services.user.get_by_login
+Index("ix_users_login_lower", func.lower(User.login))
+
+# Full-text index of User columns normalized by services.search, rowid is the
+# user id. Not part of the ORM metadata since it is a FTS5 virtual table.
+UserSearch = sa.table(
+    "users_search",
+    sa.column("rowid"),
+    sa.column("login"),
+    sa.column("display_name"),
+    sa.column("bio"),
+)
+sa.event.listen(
+    Table.metadata,
+    "after_create",
+    sa.DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS users_search"
+        " USING fts5(login, display_name, bio, tokenize='trigram')"
+    ),
+)
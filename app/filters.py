@@ -1,27 +1,37 @@
+import functools
 from datetime import datetime
 
-from arrow import Arrow
 from sssimp import filters
 
-from app import app, config
+from app import app, data, dates
+
+
+@functools.lru_cache(maxsize=1024)
+def render_markdown(value: str) -> str:
+    return filters.markdown(value)
 
 
 @app.add_template_filter
 def markdown(value: str):
+    """
+    Markdown from data files is rendered when loading them. Other values, such
+    as user bios, are cached by content.
+    """
     if not value:
         return ""
-    return filters.markdown(value)
+    if (html := data.get_snapshot().markdown.get(value)) is not None:
+        return html
+    return render_markdown(value)
 
 
 @app.add_template_filter
 def humanize(value: datetime):
-    arrow = Arrow.fromdatetime(value)
-    return arrow.humanize(locale=config.LANG)
+    return dates.humanize(value)
 
 
 @app.add_template_filter
 def arrow(value: datetime):
-    return Arrow.fromdatetime(value)
+    return dates.get(value)
 
 
 @app.add_template_filter
@@ -27,6 +27,16 @@ class Form(FlaskForm):
         return result
 
 
+class QueryForm(Form):
+    """
+    Form submitted with GET to filter a page. It changes nothing so it does
+    not need a CSRF token, which would create a session for every visitor.
+    """
+
+    class Meta:
+        csrf = False
+
+
 class LoginField(StringField):
     def __init__(self, **kwargs):
         validators = kwargs.pop("validators", [])
@@ -1,5 +1,11 @@
+import base64
+import binascii
+import json
+import time
 import typing as t
 
+import sqlalchemy as sa
+
 
 class Pager:
     items_total: int = 0
@@ -95,3 +101,127 @@ class Pager:
         url = furl(flask.request.url)
         url.args["page"] = page
         return url.url
+
+
+class KeysetPager:
+    """
+    Pages through an ordered query by filtering on the sort key of the last
+    item seen instead of using OFFSET, so deep pages are as fast as the first
+    one. `key` are the ascending columns of the order, unique together, with
+    JSON serializable values. Pages are identified by opaque cursors.
+    """
+
+    def __init__(
+        self,
+        query,
+        key: t.Sequence,
+        cursor: str = None,
+        per_page: int = 10,
+        total: int = None,
+    ):
+        self.query = query
+        self.key = tuple(key)
+        self.per_page = per_page
+        self.items_total = total
+        self.cursor = cursor
+
+        direction, values = self.decode(cursor)
+        query = query.order_by(None)
+        position = sa.tuple_(*self.key)
+        if direction == "before":
+            query = query.filter(position < sa.tuple_(*values))
+            query = query.order_by(*(column.desc() for column in self.key))
+        else:
+            if values is not None:
+                query = query.filter(position > sa.tuple_(*values))
+            query = query.order_by(*self.key)
+        # One more item to know whether there is a page after this one
+        items = query.limit(per_page + 1).all()
+        more = len(items) > per_page
+        items = items[:per_page]
+        if direction == "before":
+            items.reverse()
+            self.has_prev, self.has_next = more, True
+        else:
+            self.has_prev, self.has_next = values is not None, more
+        self.items = items
+
+    def get_values(self, item) -> list:
+        return [getattr(item, column.key) for column in self.key]
+
+    @staticmethod
+    def encode(direction: str, values: list) -> str:
+        data = json.dumps([direction, values], separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode(self, cursor: str | None) -> tuple[str, list | None]:
+        """Invalid cursors lead to the first page"""
+        if not cursor:
+            return "after", None
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            direction, values = json.loads(data)
+        except (binascii.Error, ValueError, TypeError):
+            return "after", None
+        if direction not in ("after", "before"):
+            return "after", None
+        if not isinstance(values, list) or len(values) != len(self.key):
+            return "after", None
+        return direction, values
+
+    @property
+    def next(self) -> str | None:
+        if not self.has_next or not self.items:
+            return None
+        return self.encode("after", self.get_values(self.items[-1]))
+
+    @property
+    def prev(self) -> str | None:
+        if not self.has_prev or not self.items:
+            return None
+        return self.encode("before", self.get_values(self.items[0]))
+
+    def __iter__(self):
+        return iter(self.items)
+
+    @classmethod
+    def get_from_request(cls, *args, **kwargs):
+        import flask
+
+        cursor = flask.request.args.get("cursor")
+        return cls(*args, cursor=cursor, **kwargs)
+
+    @classmethod
+    def get_url(cls, cursor):
+        import flask
+        from furl import furl
+
+        url = furl(flask.request.url)
+        url.args.pop("page", None)
+        url.args["cursor"] = cursor
+        return url.url
+
+
+_counts: dict[str, tuple[float, int]] = {}
+COUNTS_MAX_SIZE = 256
+
+
+def count(query, ttl: float = 0) -> int:
+    """
+    Number of rows of `query`, reused for `ttl` seconds by identical queries,
+    for totals that do not need to be exact.
+    """
+    if ttl <= 0:
+        return query.count()
+    statement = query.statement.compile(compile_kwargs={"literal_binds": True})
+    key = str(statement)
+    now = time.monotonic()
+    entry = _counts.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+    result = query.count()
+    _counts.pop(key, None)
+    _counts[key] = (now + ttl, result)
+    while len(_counts) > COUNTS_MAX_SIZE:
+        _counts.pop(next(iter(_counts)))
+    return result
@@ -1,17 +1,15 @@
 import flask
-import sqlalchemy.orm as sa_orm
 from wtforms import SelectField, StringField
 
 from app import app
-from app.db import Game
-from app.forms import Form
+from app.forms import QueryForm
 from app.services import games as service
 
 
-class SearchForm(Form):
+class SearchForm(QueryForm):
     name = StringField()
     platform = SelectField(
-        choices=[("all", "Tous"), ("", "-----")]
+        choices=lambda: [("all", "Tous"), ("", "-----")]
         + [(p, p) for p in service.get_platforms()]
     )
 
@@ -19,10 +17,13 @@ class SearchForm(Form):
 @app.route("/games/")
 def games(form: SearchForm):
     form.platform.data = form.platform.data or "Arcade"
-    games_ = service.get_all(sort="name")
-    for game in games_:
-        game.load_db(sa_orm.joinedload(Game.users))
-    return app.render("games", games=games_, title="Les jeux", form=form)
+    return app.render(
+        "games",
+        games=service.get_all(sort="name"),
+        stats=service.get_stats(),
+        title="Les jeux",
+        form=form,
+    )
 
 
 @app.route("/games/<slug>/")
@@ -1,39 +1,89 @@
-from dataclasses import dataclass
-
 import flask
 
-from app import app
-from app.db import User
-from app.services import user
-
-
-@dataclass
-class UserPoint:
-    latitude: float
-    longitude: float
-    map_point: str
-    map_point_id: int
-    name: str
-    icon: str
-    link: str
+from app import app, config
+from app.services import gps
+from app.services import map as service
+from app.services import spatial
 
 
 @app.get("/map/")
 def map():
-    with app.session() as s:
-        query = s.query(User)
-        user.filter_public(query)
-        query = query.filter(User.map_point_id.isnot(None))
-        user_points = [
-            UserPoint(
-                latitude=user.map_point.latitude,
-                longitude=user.map_point.longitude,
-                map_point=user.map_point.name,
-                map_point_id=user.map_point_id,
-                name=user.name,
-                icon=user.avatar_url,
-                link=flask.url_for("user", login=user.login),
-            )
-            for user in query
-        ]
-    return app.render("map", user_points=user_points)
+    regions = [
+        {
+            "min_zoom": level["min_zoom"],
+            "url": flask.url_for("map_regions", name=level["file"]),
+        }
+        for level in gps.get_regions_levels()
+    ]
+    return app.render("map", mode=config.MAP_MODE, regions=regions)
+
+
+@app.get("/map/regions/<name>")
+def map_regions(name: str):
+    return gps.send_regions_file(name)
+
+
+@app.get("/api/map/users")
+def api_map_users():
+    return service.respond(
+        service.get_users_payload(), mimetype="application/geo+json"
+    )
+
+
+@app.get("/api/map/groups/<any(points, regions):level>")
+def api_map_groups(level: str):
+    return service.respond(service.get_groups_payload(level))
+
+
+@app.get("/api/map/points/<int:id>")
+def api_map_point(id: int):
+    point = service.get_point(id)
+    if point is None:
+        return flask.abort(404)
+    return point
+
+
+def get_point_data(point: spatial.IndexedPoint, distance: float) -> dict:
+    return {
+        "id": point.id,
+        "name": point.name,
+        "latitude": point.latitude,
+        "longitude": point.longitude,
+        "distance_km": round(distance, 1),
+    }
+
+
+@app.get("/api/map/nearest")
+def api_map_nearest():
+    latitude = flask.request.args.get("lat", type=float)
+    longitude = flask.request.args.get("lng", type=float)
+    if latitude is None or longitude is None:
+        return flask.abort(400)
+    result = spatial.get_nearest_point(latitude, longitude)
+    if result is None:
+        return flask.abort(404)
+    return get_point_data(*result)
+
+
+@app.get("/api/map/points/<int:id>/members")
+def api_map_point_members(id: int):
+    radius = flask.request.args.get("radius", 50, type=float)
+    radius = max(0, min(radius, config.MAP_MAX_RADIUS))
+    result = spatial.get_members_within(id, radius)
+    if result is None:
+        return flask.abort(404)
+    center, members = result
+    return {
+        "point": get_point_data(center, 0),
+        "radius_km": radius,
+        "users": [
+            {
+                "name": user.name,
+                "icon": user.avatar_url,
+                "link": flask.url_for("user", login=user.login),
+                "map_point_id": user.map_point_id,
+                "distance_km": round(distance, 1),
+            }
+            for user, distance in members
+        ],
+    }
@@ -1,17 +1,22 @@
+from dataclasses import dataclass
+
+import flask
+import sqlalchemy as sa
 from wtforms import SelectField, StringField
 
-from app import app
+from app import app, config
 from app.db import Game, User, UserGame
-from app.forms import Form
-from app.paging import Pager
-from app.services import games
+from app.forms import QueryForm
+from app import paging
+from app.paging import KeysetPager
+from app.services import games, search
 from app.services import user as service
 
 
-class SearchForm(Form):
+class SearchForm(QueryForm):
     name = StringField()
     game = SelectField(
-        choices=[("", "Tous"), ("", "-----")]
+        choices=lambda: [("", "Tous"), ("", "-----")]
         + [(x.slug, x.name) for x in games.get_all(sort="name")],
         default="all",
     )
@@ -27,14 +32,51 @@ def users(form: SearchForm):
         query = s.query(User)
         query = service.filter_public(query)
         if form.name.data:
-            query = query.where(
-                User.display_name.ilike(f"%{form.name.data}%")
-                | User.login.ilike(f"%{form.name.data}%")
-            )
+            matches = search.match(form.name.data).subquery()
+            query = query.filter(User.id.in_(sa.select(matches.c.rowid)))
         if form.game.data:
             game = s.query(Game).filter_by(slug=form.game.data).one()
             query = query.filter(User.games.any(UserGame.game_id == game.id))
-        pager = Pager.get_from_request(query, per_page=20, total=query.count())
+        pager = KeysetPager.get_from_request(
+            query,
+            key=[User.id],
+            per_page=20,
+            total=paging.count(query, ttl=config.PAGER_COUNT_TTL),
+        )
         return app.render(
             "users/listing", pager=pager, title="Membres", form=form
         )
+
+
+@dataclass
+class SearchResult:
+    login: str
+    name: str
+    avatar_url: str
+    url: str
+
+
+@dataclass
+class SearchResponse:
+    users: list[SearchResult]
+
+
+@app.get("/api/users/search")
+def api_users_search():
+    query = flask.request.args.get("q", "")
+    limit = min(flask.request.args.get("limit", 10, type=int), 20)
+    if not query.strip():
+        return SearchResponse(users=[])
+    with app.session() as s:
+        users = search.search(s, query, limit=limit)
+        return SearchResponse(
+            users=[
+                SearchResult(
+                    login=user.login,
+                    name=user.name,
+                    avatar_url=user.avatar_url,
+                    url=flask.url_for("user", login=user.login),
+                )
+                for user in users
+            ]
+        )
@@ -159,6 +159,7 @@ def settings(form: EditProfileForm):
             if avatar.update(user, form.image_type.data, form.image.data):
                 modified["avatar"] = True
         except avatar.UnsupportedImageFormat:
+            s.rollback()
             flask.flash("Format d'image non supporté", "error")
             return app.redirect("settings")
 
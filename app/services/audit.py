@@ -1,12 +1,11 @@
 import logging
 
-import requests
-
 from app import config
+from app.services.http_client import client
 
 
 def _send(content):
-    requests.post(config.AUDIT_WEBHOOK, json={"content": content})
+    client.post(config.AUDIT_WEBHOOK, json={"content": content})
 
 
 def log(*args, level=logging.INFO, codeblock=None, **kwargs):
@@ -13,19 +13,82 @@ class Config:
     ARROW_LANG: str = "fr"
     AUDIT_WEBHOOK: str = None
     AVATAR_SIZE: int = 256
+    DATA_RELOAD_INTERVAL: float = 10
     DISCORD_AVATAR_SIZE: int = AVATAR_SIZE
     DISCORD_BOT_TOKEN: str = None
     DISCORD_SERVER_ID: str = None
+    # Seconds during which game role changes are gathered before being sent
+    # to Discord, 0 to send them immediately
+    DISCORD_ROLE_SYNC_DELAY: float = 2
+    # Game role changes sent to Discord at the same time
+    DISCORD_ROLE_SYNC_WORKERS: int = 4
+    # Seconds during which the Discord server and its roles are reused
+    DISCORD_SERVER_TTL: float = 300
     GRAVATAR_AVATAR_SIZE: int = AVATAR_SIZE
+    # Outbound requests connect and read timeouts in seconds
+    HTTP_TIMEOUT: list = dataclasses.field(default_factory=lambda: [3.05, 10])
+    # Retries of idempotent outbound requests, waiting HTTP_BACKOFF seconds
+    # doubled after each attempt
+    HTTP_RETRIES: int = 3
+    HTTP_BACKOFF: float = 0.5
+    # Seconds after which a request is not retried anymore, the last attempt
+    # can still last up to HTTP_TIMEOUT
+    HTTP_RETRIES_DEADLINE: float = 10
+    # Hosts whose connections are kept alive, and connections kept per host
+    HTTP_POOL_HOSTS: int = 10
+    HTTP_POOL_SIZE: int = 10
+    # Seconds between batched writes of users last seen times, 0 to write
+    # immediately
+    LAST_SEEN_FLUSH_INTERVAL: float = 30
+    # Seconds under which a new last seen time is not worth saving
+    LAST_SEEN_GRANULARITY: float = 60
+    # Seconds during which paginated lists reuse their total count
+    PAGER_COUNT_TTL: float = 60
     SERVER_NAME: str = "localhost:5000"
+    # "sqlalchemy" for var/sessions.db, or "cachelib" for files in var/
+    SESSION_BACKEND: str = "sqlalchemy"
     CLOUD_ASSETS_URL: str = "https://asso-msn.fr/assets"
     TWITCH_CLIENT_ID: str = None
     TWITCH_CLIENT_SECRET: str = None
+    # Seconds during which games members and favorites counts are reused,
+    # changes made by the same process are visible immediately
+    GAMES_STATS_TTL: float = 60
     GAMES_SHOWCASE: list = dataclasses.field(
         default_factory=lambda: ["2dx", "ddr", "sdvx", "taiko", "popn", "gc"]
     )
     MAP_ACCESS_TOKEN: str = None
+    # Seconds during which the map data is reused, changes made by the same
+    # process are visible immediately
+    MAP_CACHE_TTL: float = 60
+    # "users" for a marker per user, "groups" for a marker per map point or
+    # region with the users counts
+    MAP_MODE: str = "users"
+    # Avatars shown on each group marker
+    MAP_GROUP_SAMPLE_SIZE: int = 3
+    # Zoom level from which each regions file is used, with the tolerance in
+    # degrees used to simplify its borders
+    MAP_REGIONS_LEVELS: dict = dataclasses.field(
+        default_factory=lambda: {0: 0.01, 8: 0.001}
+    )
+    # Distinct values per axis of the regions coordinates
+    MAP_REGIONS_QUANTIZATION: int = 100000
+    # Maximum distance in km of members searches around a map point
+    MAP_MAX_RADIUS: float = 500
     RUN_TASKS: bool = False
+    SQLITE_PRAGMAS: dict = dataclasses.field(
+        default_factory=lambda: {
+            "journal_mode": "wal",
+            "synchronous": "normal",
+            "busy_timeout": 5000,
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -32 * 1024,
+            "temp_store": "memory",
+        }
+    )
+    SQLITE_POOL_SIZE: int = 10
+    SQLITE_POOL_OVERFLOW: int = 20
+    # Seconds during which a loaded user is reused by other requests
+    USER_CACHE_TTL: float = 30
 
     @property
     def LANG(self):
@@ -1,23 +1,35 @@
+import atexit
+import concurrent.futures
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
 import typing as t
 import urllib
+from dataclasses import dataclass
+from pathlib import Path
 
+import pydantic
 import requests
+import sqlalchemy as sa
 from pydantic import BaseModel as Model
-from requests import Session
 
-from app import app, config
-from app.db import User
+from app import VAR_DIR, app, config, data
+from app.db import Game as GameTable
+from app.db import User, UserGame
 from app.services import audit, games
 from app.services.games import Game
+from app.services.http_client import client
 
 BASE_URL = "https://discord.com"
-API_URL = f"{BASE_URL}/api/v10"
+API_PATH = "/api/v10"
+API_URL = f"{BASE_URL}{API_PATH}"
 CDN_URL = "https://cdn.discordapp.com"
 SCOPES = ("email", "identify")
 
-session = Session()
-session.headers["Content-Type"] = "application/x-www-form-urlencoded"
-
 
 class AuthorizationParams(Model):
     client_id: str = config.DISCORD_CLIENT_ID
@@ -55,7 +67,7 @@ def get_discord_token(code: str) -> AccessTokenResponse:
     data = AccessTokenRequest(
         code=code, redirect_uri=app.url_for("discord_callback", _external=True)
     )
-    response = session.post(
+    response = client.post(
         url,
         data=data.model_dump(),
         auth=(config.DISCORD_CLIENT_ID, config.DISCORD_CLIENT_SECRET),
@@ -72,7 +84,7 @@ class RefreshTokenRequest(Model):
 def refresh(refresh_token: str) -> AccessTokenResponse:
     url = f"{API_URL}/oauth2/token"
     data = RefreshTokenRequest(refresh_token=refresh_token)
-    response = session.post(
+    response = client.post(
         url,
         data=data.model_dump(),
         auth=(config.DISCORD_CLIENT_ID, config.DISCORD_CLIENT_SECRET),
@@ -81,8 +93,174 @@ def refresh(refresh_token: str) -> AccessTokenResponse:
     return AccessTokenResponse(**response.json())
 
 
+@dataclass
+class RateLimitStats:
+    requests: int = 0
+    # Requests delayed because their bucket or the global limit was exhausted
+    waits: int = 0
+    wait_time: float = 0
+    # 429 responses, despite the tracking
+    limited: int = 0
+    global_limited: int = 0
+
+    def __str__(self):
+        return (
+            f"{self.requests} requests, {self.waits} delayed for"
+            f" {self.wait_time:.1f}s, {self.limited} rate limited"
+            f" ({self.global_limited} global)"
+        )
+
+
+@dataclass
+class Bucket:
+    remaining: int = 1
+    # time.monotonic() value when `remaining` is reset by Discord
+    reset: float = 0
+
+
+class RateLimiter:
+    """
+    Tracks Discord rate limits of one token from the X-RateLimit-* headers and
+    delays requests that would exceed them.
+    https://discord.com/developers/docs/topics/rate-limits
+    """
+
+    # Resources whose id is part of the bucket, other ids share it
+    MAJOR_PARAMETERS = ("channels", "guilds", "webhooks")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # By bucket hash and major parameter
+        self.buckets: dict[tuple[str, str], Bucket] = {}
+        # Bucket hash of each route, learned from responses
+        self.routes: dict[str, str] = {}
+        self.global_reset = 0
+        self.stats = RateLimitStats()
+
+    @classmethod
+    def get_route(cls, method: str, path: str) -> tuple[str, str]:
+        """Route template and major parameter of a request"""
+        parts = path.strip("/").split("/")
+        major = ""
+        for i, part in enumerate(parts):
+            if not part.isdigit():
+                continue
+            if parts[i - 1] in cls.MAJOR_PARAMETERS and not major:
+                major = part
+                continue
+            parts[i] = ":id"
+        return f"{method} /{'/'.join(parts)}", major
+
+    def get_bucket(self, route: str, major: str) -> Bucket:
+        key = (self.routes.get(route, route), major)
+        return self.buckets.setdefault(key, Bucket())
+
+    def acquire(self, route: str, major: str):
+        """Waits until the request can be sent without being rate limited"""
+        waited = False
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                bucket = self.get_bucket(route, major)
+                if bucket.reset <= now:
+                    bucket.remaining = max(bucket.remaining, 1)
+                delay = self.global_reset - now
+                if bucket.remaining <= 0:
+                    delay = max(delay, bucket.reset - now)
+                if delay <= 0:
+                    bucket.remaining -= 1
+                    self.stats.requests += 1
+                    return
+                if not waited:
+                    self.stats.waits += 1
+                    waited = True
+                self.stats.wait_time += delay
+            time.sleep(delay)
+
+    def update(self, route: str, major: str, response: requests.Response):
+        headers = response.headers
+        with self.lock:
+            now = time.monotonic()
+            if bucket_hash := headers.get("X-RateLimit-Bucket"):
+                self.routes[route] = bucket_hash
+            bucket = self.get_bucket(route, major)
+            if "X-RateLimit-Remaining" in headers:
+                bucket.remaining = int(headers["X-RateLimit-Remaining"])
+            if "X-RateLimit-Reset-After" in headers:
+                reset_after = float(headers["X-RateLimit-Reset-After"])
+                bucket.reset = now + reset_after
+
+            if response.status_code != 429:
+                return
+            self.stats.limited += 1
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+            retry_after = float(
+                data.get("retry_after") or headers.get("Retry-After") or 1
+            )
+            if data.get("global") or headers.get("X-RateLimit-Global"):
+                self.stats.global_limited += 1
+                self.global_reset = now + retry_after
+            else:
+                bucket.remaining = 0
+                bucket.reset = now + retry_after
+
+    def pop_stats(self) -> RateLimitStats:
+        with self.lock:
+            result, self.stats = self.stats, RateLimitStats()
+        return result
+
+
+_bot_limiter = RateLimiter()
+# Limiters of user tokens, by token hash, least recently used first
+_limiters: dict[str, RateLimiter] = {}
+LIMITERS_MAX_SIZE = 256
+_limiters_lock = threading.Lock()
+# Stats of evicted limiters, not popped yet
+_evicted_stats = RateLimitStats()
+
+
+def add_stats(result: RateLimitStats, stats: RateLimitStats):
+    for field in dataclasses.fields(stats):
+        value = getattr(result, field.name) + getattr(stats, field.name)
+        setattr(result, field.name, value)
+
+
+def get_limiter(access_token: str) -> RateLimiter:
+    """
+    Rate limits are per token, shared by every API instance using it. Only
+    the most recently used user tokens are tracked, by hash.
+    """
+    if access_token == config.DISCORD_BOT_TOKEN:
+        return _bot_limiter
+    key = hashlib.sha256(access_token.encode()).hexdigest()
+    with _limiters_lock:
+        limiter = _limiters.pop(key, None) or RateLimiter()
+        _limiters[key] = limiter
+        while len(_limiters) > LIMITERS_MAX_SIZE:
+            evicted = _limiters.pop(next(iter(_limiters)))
+            add_stats(_evicted_stats, evicted.pop_stats())
+    return limiter
+
+
+def pop_rate_limit_stats() -> RateLimitStats:
+    """Stats of every token since the previous call"""
+    global _evicted_stats
+    with _limiters_lock:
+        limiters = [_bot_limiter, *_limiters.values()]
+        result, _evicted_stats = _evicted_stats, RateLimitStats()
+    for limiter in limiters:
+        add_stats(result, limiter.pop_stats())
+    return result
+
+
 class API:
-    def __init__(self, access_token: str, bot=None):
+    # Attempts of a request answered with 429
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, access_token: str, bot=None, base_url=BASE_URL):
         if not access_token:
             raise ValueError("Missing Discord access_token")
 
@@ -91,18 +269,27 @@ class API:
             bot = "." in access_token
         auth_type = "Bot" if bot else "Bearer"
         self._authorization_header = f"{auth_type} {access_token}"
+        self.base_url = base_url
+        self.rate_limiter = get_limiter(access_token)
 
     def request(self, method, url: str, data=None, **kwargs):
         api = kwargs.pop("api", True)
-        base = API_URL if api else BASE_URL
-        url = base + url
-        response = requests.request(
-            method,
-            url,
-            params=kwargs,
-            json=data,
-            headers={"Authorization": self._authorization_header},
-        )
+        route, major = self.rate_limiter.get_route(method, url)
+        if api:
+            url = API_PATH + url
+        url = self.base_url + url
+        for _ in range(self.MAX_ATTEMPTS):
+            self.rate_limiter.acquire(route, major)
+            response = client.request(
+                method,
+                url,
+                params=kwargs,
+                json=data,
+                headers={"Authorization": self._authorization_header},
+            )
+            self.rate_limiter.update(route, major, response)
+            if response.status_code != 429:
+                break
         response.raise_for_status()
         if not response.text:
             return
@@ -319,35 +506,6 @@ def refresh_token(user: User) -> bool:
     return True
 
 
-def _update_game_role(user: User, game: Game, action: str):
-    if not user.has_discord:
-        return
-
-    # Do not crash if Discord game role update fails
-    try:
-        api = API(config.DISCORD_BOT_TOKEN)
-        server = api.get_server()
-        if not api.get_member(user.discord_id):
-            audit.log(
-                f"Discord account of {user} not found in server",
-                discord_id=user.discord_id,
-                server=server,
-            )
-            return
-        role = server.get_role(game.name)
-        if not role:
-            return
-        user_id = user.discord_id
-        role_id = role.id
-        if action == "add":
-            api.add_role(server.id, user_id, role_id)
-        elif action == "remove":
-            api.remove_role(server.id, user_id, role_id)
-        audit.log(f"Discord game role {role} {action} for {user}")
-    except Exception as e:
-        audit.log(f"Discord game {action} error", user=user, game=game, error=e)
-
-
 def invalidate_user(user: User):
     result = bool(user.discord_access_token or user.discord_refresh_token)
     user.discord_access_token = None
@@ -357,48 +515,299 @@ def invalidate_user(user: User):
     return result
 
 
+class Guild:
+    """Discord server with its roles indexed by id, name and game"""
+
+    def __init__(self, server: API.Server, fetched: float):
+        self.server = server
+        self.fetched = fetched
+        self.roles_by_id = {role.id: role for role in server.roles}
+        # The highest role wins when several have the same name
+        self.roles_by_name = {
+            role.name: role for role in reversed(server.roles)
+        }
+        # Slug of the game of each game role
+        self.games_by_role: dict[str, str] = {}
+        for role in server.roles:
+            if game := games.get_by_name(role.name):
+                self.games_by_role[role.id] = game.slug
+
+    @property
+    def id(self) -> str:
+        return self.server.id
+
+    @property
+    def roles(self) -> list[API.Role]:
+        """Highest roles first"""
+        return self.server.roles
+
+    def get_role(self, name: str) -> API.Role | None:
+        return self.roles_by_name.get(name)
+
+    def get_game(self, role_id: str) -> Game | None:
+        if slug := self.games_by_role.get(role_id):
+            return games.get(slug)
+
+
+class GuildCache:
+    """
+    Discord server metadata, kept in memory and in a file shared with the
+    other processes for DISCORD_SERVER_TTL seconds.
+    """
+
+    def __init__(self, path: Path, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self.guild: Guild = None
+        self.lock = threading.Lock()
+
+    def is_fresh(self, fetched: float) -> bool:
+        return time.time() - fetched < self.ttl
+
+    def read(self) -> Guild | None:
+        try:
+            with self.path.open() as f:
+                data = json.load(f)
+            if not self.is_fresh(data["fetched"]):
+                return None
+            return Guild(API.Server(**data["server"]), data["fetched"])
+        except (OSError, ValueError, KeyError, pydantic.ValidationError):
+            return None
+
+    def write(self, guild: Guild):
+        self.path.parent.mkdir(exist_ok=True)
+        data = {"fetched": guild.fetched, "server": guild.server.model_dump()}
+        temp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with temp.open("w") as f:
+            json.dump(data, f)
+        temp.replace(self.path)
+
+    def get(self) -> Guild:
+        with self.lock:
+            if self.guild and self.is_fresh(self.guild.fetched):
+                return self.guild
+            guild = self.read()
+            if guild is None:
+                api = API(config.DISCORD_BOT_TOKEN)
+                guild = Guild(api.get_server(), time.time())
+                self.write(guild)
+            self.guild = guild
+            return guild
+
+    def invalidate(self, shared=True):
+        """Forgets the server, in every process unless `shared` is false"""
+        with self.lock:
+            self.guild = None
+            if shared:
+                self.path.unlink(missing_ok=True)
+
+
+guild_cache = GuildCache(
+    path=VAR_DIR / "discord_server.json", ttl=config.DISCORD_SERVER_TTL
+)
+
+
+def get_guild() -> Guild:
+    return guild_cache.get()
+
+
+@data.on_reload
+def on_data_reload(snapshot):
+    # Game names may have changed, the file has no games to invalidate
+    guild_cache.invalidate(shared=False)
+
+
+class RoleSyncQueue:
+    """
+    Game role changes waiting to be sent to Discord by a background thread.
+    Changes of the same user and game are coalesced into the last one.
+    """
+
+    def __init__(self, delay: float, workers: int):
+        self.delay = delay
+        self.workers = workers
+        # Whether the role should be added, by Discord user id and game name
+        self.pending: dict[tuple[str, str], bool] = {}
+        # User description for the audit log, by Discord user id
+        self.users: dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.thread = None
+
+    def put(self, user: User, game: Game, add: bool):
+        if not user.has_discord:
+            return
+        with self.lock:
+            self.pending[user.discord_id, game.name] = add
+            self.users[user.discord_id] = repr(user)
+            if self.thread is None and self.delay:
+                self.thread = threading.Thread(
+                    target=self.run, name="discord-roles", daemon=True
+                )
+                self.thread.start()
+                # Executors cannot be used anymore when atexit runs
+                atexit.register(self.flush, parallel=False)
+        if self.delay:
+            self.event.set()
+        else:
+            self.flush()
+
+    def flush(self, parallel=True) -> int:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            users, self.users = self.users, {}
+        if not pending:
+            return 0
+        try:
+            api = API(config.DISCORD_BOT_TOKEN)
+            guild = get_guild()
+        except Exception as e:
+            audit.log("Discord game roles sync error", error=e)
+            return 0
+
+        changes = []
+        for (user_id, name), add in pending.items():
+            if role := guild.get_role(name):
+                changes.append((users[user_id], user_id, role, add))
+        if not parallel:
+            for change in changes:
+                self.apply(api, guild, *change)
+            return len(changes)
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            list(executor.map(lambda x: self.apply(api, guild, *x), changes))
+        return len(changes)
+
+    @staticmethod
+    def apply(api: API, guild: Guild, user, user_id, role, add):
+        action = "add" if add else "remove"
+        try:
+            if add:
+                api.add_role(guild.id, user_id, role.id)
+            else:
+                api.remove_role(guild.id, user_id, role.id)
+        except requests.HTTPError as e:
+            if e.response.status_code == 404:
+                audit.log(
+                    f"Discord account of {user} not found in server",
+                    discord_id=user_id,
+                    server=guild.server.name,
+                )
+                return
+            audit.log(f"Discord game {action} error", user=user, error=e)
+            return
+        except Exception as e:
+            audit.log(f"Discord game {action} error", user=user, error=e)
+            return
+        audit.log(f"Discord game role {role} {action} for {user}")
+
+    def run(self):
+        while True:
+            self.event.wait()
+            # Let quick toggles of the same game cancel out
+            time.sleep(self.delay)
+            self.event.clear()
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Could not sync Discord game roles")
+
+
+role_sync = RoleSyncQueue(
+    delay=config.DISCORD_ROLE_SYNC_DELAY,
+    workers=config.DISCORD_ROLE_SYNC_WORKERS,
+)
+
+
 def add_game(user: User, game: Game):
-    _update_game_role(user, game, "add")
+    role_sync.put(user, game, add=True)
 
 
 def remove_game(user: User, game: Game):
-    _update_game_role(user, game, "remove")
+    role_sync.put(user, game, add=False)
 
 
 def import_games_lists(login=None):
-    refreshed_users = []
+    """
+    Makes games lists match the game roles of Discord members, in a single
+    transaction. Returns the users whose list changed.
+    """
     api = API(config.DISCORD_BOT_TOKEN)
-    server = api.get_server()
+    guild = get_guild()
     members_by_id = {
-        member["user"]["id"]: member for member in api.get_members(server.id)
+        member["user"]["id"]: member for member in api.get_members(guild.id)
     }
-    roles_by_id = {role.id: role.name for role in server.roles}
-    game_roles = {}
-    for role_id, role_name in roles_by_id.items():
-        if game := games.get_by_name(role_name):
-            game_roles[role_id] = game
     with app.session() as s:
-        query = s.query(User).filter(User.discord_id)
+        slugs = set(guild.games_by_role.values())
+        games_by_id = {}
+        game_ids = {}
+        for id, slug in s.execute(
+            sa.select(GameTable.id, GameTable.slug).filter(
+                GameTable.slug.in_(slugs)
+            )
+        ):
+            games_by_id[id] = games.get(slug)
+            game_ids[slug] = id
+        role_games = {
+            role_id: game_ids[slug]
+            for role_id, slug in guild.games_by_role.items()
+            if slug in game_ids
+        }
+
+        query = sa.select(User).filter(User.discord_id.isnot(None))
         if login:
             query = query.filter_by(login=login)
-        for user in query:
+        users = {}
+        desired = set()
+        for user in s.scalars(query):
             if not (member := members_by_id.get(user.discord_id)):
                 continue
-            changed = False
-            for role_id, game in game_roles.items():
-                if role_id in member["roles"]:
-                    changed = (
-                        games.add_to_list(game.slug, user, discord=False)
-                        or changed
-                    )
-                else:
-                    changed = (
-                        games.remove_from_list(game.slug, user, discord=False)
-                        or changed
-                    )
-            if changed:
-                refreshed_users.append(repr(user))
+            users[user.id] = user
+            for role_id in member["roles"]:
+                if game_id := role_games.get(role_id):
+                    desired.add((user.id, game_id))
+
+        existing = {
+            (row.user_id, row.game_id)
+            for row in s.execute(
+                sa.select(UserGame.user_id, UserGame.game_id).filter(
+                    UserGame.user_id.in_(users),
+                    UserGame.game_id.in_(games_by_id),
+                )
+            )
+        }
+        added = desired - existing
+        removed = existing - desired
+        if added:
+            s.execute(
+                sa.insert(UserGame),
+                [
+                    {"user_id": user_id, "game_id": game_id}
+                    for user_id, game_id in added
+                ],
+            )
+        if removed:
+            s.execute(
+                sa.delete(UserGame).filter(
+                    sa.tuple_(UserGame.user_id, UserGame.game_id).in_(removed)
+                )
+            )
+        s.commit()
+
+        changes: dict[int, tuple[list[str], list[str]]] = {}
+        for pairs, index in ((added, 0), (removed, 1)):
+            for user_id, game_id in sorted(pairs):
+                names = changes.setdefault(user_id, ([], []))[index]
+                names.append(games_by_id[game_id].name)
+        for user_id, (added_names, removed_names) in changes.items():
+            audit.log(
+                f"Discord games imported for {users[user_id]}",
+                added=added_names,
+                removed=removed_names,
+            )
+        refreshed_users = [repr(users[user_id]) for user_id in changes]
 
+    if changes:
+        games.invalidate_stats()
     return refreshed_users
 
 
@@ -18,6 +18,10 @@ def handle_exception(e):
     if isinstance(e, HTTPException):
         return e
 
+    # Do not commit what the request left half done
+    with app.session() as s:
+        s.rollback()
+
     trace = traceback.format_exc()
     audit.log(
         "Unhandled exception",
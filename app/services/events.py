@@ -1,11 +1,14 @@
+import bisect
 import dataclasses
 import enum
+import functools
+import typing as t
 from dataclasses import dataclass
 from datetime import datetime
 
 import arrow
 
-from app import config, data
+from app import data, dates
 
 
 @dataclass
@@ -34,11 +37,14 @@ class Event:
     games: list[str] = dataclasses.field(default_factory=list)
     links: dict[str, str] = dataclasses.field(default_factory=dict)
 
-    templates = data.load("events_templates")
+    @property
+    def templates(self) -> dict:
+        return data.load("events_templates")
 
     @classmethod
     def from_data_file(cls, key, value):
-        value = value or {}
+        # Copy as the parsed data is shared with app.data
+        value = dict(value or {})
         date = "-".join(key.split("-")[:3])
         date = datetime.fromisoformat(date)
         template = key.split("-")[3]
@@ -69,34 +75,32 @@ class Event:
             return display(self.start_time)
         return f"{display(self.start_time)} - {display(self.end_time)}"
 
-    @property
+    @functools.cached_property
     def arrow(self):
         if not self.date:
             return None
-        return arrow.get(self.date)
+        return dates.get(self.date)
 
     @property
     def relative_time(self):
-        return (
-            self.arrow and self.arrow.humanize(locale=config.LANG).capitalize()
-        )
+        return self.date and dates.humanize(self.date).capitalize()
 
-    @property
+    @functools.cached_property
     def day_name(self):
-        return self.arrow and self.arrow.format("dddd", locale=config.LANG)
+        return self.date and dates.format(self.date, "dddd")
 
-    @property
+    @functools.cached_property
     def day_number(self):
         if len(self.dates) > 1:
-            start = self.arrow.format("D")
-            end = arrow.get(self.dates[-1]).format("D")
+            start = dates.format(self.date, "D")
+            end = dates.format(self.dates[-1], "D")
             return f"{start} - {end}"
 
-        return self.arrow and self.arrow.format("D")
+        return self.date and dates.format(self.date, "D")
 
-    @property
+    @functools.cached_property
     def month(self):
-        return self.arrow and self.arrow.format("MMM", locale=config.LANG)
+        return self.date and dates.format(self.date, "MMM")
 
     def load_template(self):
         template = self.templates.get(self.template)
@@ -113,24 +117,83 @@ class Event:
         self.load_template()
 
 
-def get_events():
-    results = [
-        Event.from_data_file(key, event)
-        for key, event in data.load("events", flat=True).items()
-    ]
+class Slice(t.Sequence[Event]):
+    """Read-only window over a sequence, sliced without copying it first"""
+
+    def __init__(self, items: t.Sequence[Event], start: int, stop: int):
+        self.items = items
+        self.range = range(start, stop)
+
+    def __len__(self):
+        return len(self.range)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.items[i] for i in self.range[index]]
+        return self.items[self.range[index]]
+
+
+class Timeline:
+    """
+    All events of a data snapshot, built once and sorted by start date so that
+    past and future events are split with a single bisect.
+    """
+
+    def __init__(self, snapshot_events: dict):
+        events = [
+            Event.from_data_file(key, event)
+            for key, event in snapshot_events.items()
+        ]
+        events.sort(key=lambda x: x.arrow)
+        self.events = tuple(events)
+        self.events_reversed = self.events[::-1]
+        self.starts = [event.arrow.timestamp() for event in self.events]
+
+    def split_index(self, now: arrow.Arrow = None) -> int:
+        """Number of past events"""
+        now = now or arrow.now()
+        return bisect.bisect_left(self.starts, now.timestamp())
+
+    def get_future(self, now: arrow.Arrow = None) -> Slice:
+        return Slice(self.events, self.split_index(now), len(self.events))
+
+    def get_past(self, now: arrow.Arrow = None) -> Slice:
+        """Past events, most recent first"""
+        count = len(self.events)
+        return Slice(self.events_reversed, count - self.split_index(now), count)
+
+
+@data.validator
+def validate(snapshot: data.Snapshot) -> list[str]:
+    errors = []
+    for key, event_data in snapshot.view("events", flat=True).items():
+        try:
+            Event.from_data_file(key, event_data)
+        except Exception as e:
+            errors.append(f"events/{key}: {e!r}")
+    return errors
+
+
+_timeline: tuple[data.Snapshot, Timeline] = (None, None)
+
+
+def get_timeline() -> Timeline:
+    global _timeline
+    snapshot, timeline = _timeline
+    current = data.get_snapshot()
+    if snapshot is not current:
+        timeline = Timeline(current.view("events", flat=True))
+        _timeline = (current, timeline)
+    return timeline
+
 
-    results.sort(key=lambda x: x.arrow)
-    return results
+def get_events() -> tuple[Event, ...]:
+    return get_timeline().events
 
 
-def get_future_events():
-    results = get_events()
-    results = [event for event in results if not event.is_past]
-    return results
+def get_future_events() -> Slice:
+    return get_timeline().get_future()
 
 
-def get_past_events():
-    results = get_events()
-    results = [event for event in results if event.is_past]
-    results.sort(key=lambda x: x.arrow, reverse=True)
-    return results
+def get_past_events() -> Slice:
+    return get_timeline().get_past()
@@ -1,16 +1,24 @@
 import dataclasses
 import logging
+import time
 import typing as t
 from dataclasses import dataclass
 
+import sqlalchemy as sa
+
 from app import config, data
 from app.db import Game as GameTable
 from app.db import User, UserGame
 from app.services import audit
 
 
-@dataclass
+@dataclass(frozen=True)
 class Game:
+    """
+    Game as described by its data file. Instances are built once per data
+    snapshot by `GameCatalog` and shared, so they must not be mutated.
+    """
+
     @dataclass
     class Poster:
 
@@ -51,13 +59,20 @@ class Game:
     start: int = None
     end: int = None
     publisher: str = None
-    platforms: list[str] = dataclasses.field(default_factory=list)
+    platforms: tuple[str, ...] = ()
     description_short: str = None
     description: str = None
     popular: bool = False
 
-    def __post_init__(self):
-        self._db = None
+    # Computed by GameCatalog from the rest of the data snapshot
+    page: bool = dataclasses.field(default=False, repr=False, compare=False)
+    poster: Poster = dataclasses.field(default=None, repr=False, compare=False)
+    platforms_console: tuple[str, ...] = dataclasses.field(
+        default=(), repr=False, compare=False
+    )
+    platforms_short: tuple[str, ...] = dataclasses.field(
+        default=(), repr=False, compare=False
+    )
 
     def __str__(self):
         return self.name
@@ -68,136 +83,234 @@ class Game:
         return f"{config.CLOUD_ASSETS_URL}/games/{self.image}"
 
     @property
-    def page(self) -> bool:
-        from app import app
+    def platforms_smart(self):
+        if len(self.platforms_console) > 1:
+            return self.platforms_short
+        return self.platforms
 
-        return self.slug in app.data.get("games_pages", [])
+    @property
+    def path(self):
+        return data.resolve(f"games/{self.slug}.yml")
 
     @property
-    def poster(self) -> Poster:
+    def db(self) -> GameTable | None:
+        return self.load_db()
+
+    def load_db(self, *args) -> GameTable | None:
         from app import app
 
-        data = app.data.get("games_posters", {}).get(self.slug, {})
-        return self.Poster(
+        with app.session() as s:
+            query = s.query(GameTable).filter(GameTable.slug == self.slug)
+            if args:
+                query = query.options(*args)
+            return query.first()
+
+
+DATA_FIELDS = [
+    field.name
+    for field in dataclasses.fields(Game)
+    if field.compare and field.name not in ("slug", "platforms")
+]
+
+
+class GameCatalog:
+    """
+    Index of all games of a data snapshot. Games are built once, then looked up
+    by slug or case-insensitive name, and listed from pre-sorted views.
+    """
+
+    def __init__(self, snapshot: dict):
+        self.snapshot = snapshot
+        self.by_slug: dict[str, Game] = {}
+        self.by_name: dict[str, Game] = {}
+        self._views: dict[str | None, tuple[Game, ...]] = {}
+
+        for slug, game_data in snapshot.get("games", {}).items():
+            game = self.build(slug, game_data or {})
+            self.by_slug[slug] = game
+            self.by_name.setdefault(game.name.casefold(), game)
+
+        self._views[None] = tuple(self.by_slug.values())
+        self._views["name"] = self.sort("name")
+
+    def build(self, slug: str, game_data: dict) -> Game:
+        platforms_data = self.snapshot.get("platforms", {})
+        platforms = tuple(game_data.get("platforms") or ())
+        platforms_console = tuple(
+            sorted(
+                set(
+                    platform
+                    for platform in platforms
+                    if platforms_data.get(platform, {}).get("console", True)
+                )
+            )
+        )
+        platforms_short = tuple(
+            sorted(
+                set(
+                    "Console" if platform in platforms_console else platform
+                    for platform in platforms
+                )
+            )
+        )
+        poster_data = self.snapshot.get("games_posters", {}).get(slug, {})
+        poster = Game.Poster(
             **{
-                field.name: data.get(field.name)
-                for field in dataclasses.fields(self.Poster)
-                if field.name in data
+                field.name: poster_data[field.name]
+                for field in dataclasses.fields(Game.Poster)
+                if field.name in poster_data
             }
         )
-
-    @property
-    def platforms_short(self):
-        if not self.platforms:
-            return []
-
-        return sorted(
-            set(
-                "Console" if key in self.platforms_console else key
-                for key in self.platforms
-            )
+        return Game(
+            **{
+                key: value
+                for key, value in game_data.items()
+                if key in DATA_FIELDS
+            },
+            slug=slug,
+            platforms=platforms,
+            page=slug in self.snapshot.get("games_pages", []),
+            poster=poster,
+            platforms_console=platforms_console,
+            platforms_short=platforms_short,
         )
 
-    @property
-    def platforms_console(self):
-        from app import app
+    def sort(self, key: str) -> tuple[Game, ...]:
+        def sort_key(game):
+            x = getattr(game, key)
+            if isinstance(x, str):
+                x = x.lower()
+            return x
 
-        if not self.platforms:
-            return []
+        return tuple(sorted(self.by_slug.values(), key=sort_key))
 
-        platforms = app.data.get("platforms", {})
-        return sorted(
-            set(
-                platform
-                for platform in self.platforms
-                if platforms.get(platform, {}).get("console", True)
-            )
-        )
+    def get(self, slug: str) -> Game | None:
+        return self.by_slug.get(slug)
 
-    @property
-    def platforms_smart(self):
-        if len(self.platforms_console) > 1:
-            return self.platforms_short
-        return self.platforms
+    def get_by_name(self, name: str) -> Game | None:
+        return self.by_name.get(name.casefold())
 
-    @property
-    def path(self):
-        return data.resolve(f"games/{self.slug}.yml")
+    def get_all(self, sort: str = None) -> tuple[Game, ...]:
+        if sort not in self._views:
+            self._views[sort] = self.sort(sort)
+        return self._views[sort]
 
-    @property
-    def db(self):
-        if self._db is None:
-            self.load_db()
-        return self._db
 
-    def load_db(self, *args):
-        from app import app
+@data.validator
+def validate(snapshot: data.Snapshot) -> list[str]:
+    tree = snapshot.view()
+    errors = []
+    for slug, game_data in tree.get("games", {}).items():
+        try:
+            GameCatalog({**tree, "games": {slug: game_data}})
+        except Exception as e:
+            errors.append(f"games/{slug}: {e!r}")
+    return errors
 
-        with app.session() as s:
-            self._db = s.query(GameTable).filter(GameTable.slug == self.slug)
-            if args:
-                self._db = self._db.options(*args)
-            self._db = self._db.first()
 
+_catalog: GameCatalog = None
 
-def get(slug: str) -> Game | None:
+
+def get_catalog() -> GameCatalog:
+    """Catalog of the current data snapshot, rebuilt when `app.data` changes"""
     from app import app
 
-    fields = [x.name for x in dataclasses.fields(Game)]
-    game_data = app.data.get("games", {}).get(slug)
+    global _catalog
+    if _catalog is None or _catalog.snapshot is not app.data:
+        _catalog = GameCatalog(app.data)
+    return _catalog
 
-    if not game_data:
-        return None
 
-    return Game(
-        **{key: value for key, value in game_data.items() if key in fields},
-        slug=slug,
-    )
+def get(slug: str) -> Game | None:
+    return get_catalog().get(slug)
 
 
 def get_by_name(name: str) -> Game | None:
-    for game in get_all():
-        if game.name == name:
-            return game
+    return get_catalog().get_by_name(name)
 
 
-def get_all(sort=None) -> list[Game]:
-    from app import app
+def get_all(sort=None) -> tuple[Game, ...]:
+    return get_catalog().get_all(sort=sort)
 
-    result = [get(slug) for slug in app.data.get("games", {})]
-    if sort:
 
-        def sort_key(game):
-            x = getattr(game, sort)
-            if isinstance(x, str):
-                x = x.lower()
-            return x
+def get_slugs() -> list[str]:
+    return get_catalog().by_slug.keys()
 
-        result.sort(key=sort_key)
-    return result
 
+def get_popular(limit=10, sort=None) -> list[Game]:
+    return [game for game in get_all(sort=sort) if game.popular][:limit]
 
-def get_slugs() -> list[str]:
+
+@dataclass(frozen=True)
+class Stats:
+    members: int = 0
+    favorites: int = 0
+
+
+_stats: dict[str, Stats] = None
+_stats_version = 0
+_stats_expires = 0
+
+
+def get_stats() -> dict[str, Stats]:
+    """
+    Members and favorites count of every game, by slug. Computed with a single
+    query and cached until `invalidate_stats` is called in this process, or
+    for GAMES_STATS_TTL seconds for changes made by other processes.
+    """
     from app import app
 
-    return app.data.get("games", {}).keys()
+    global _stats, _stats_expires
+    if _stats is not None and _stats_expires > time.monotonic():
+        return _stats
+
+    version = _stats_version
+    query = (
+        sa.select(
+            GameTable.slug,
+            sa.func.count(UserGame.user_id),
+            sa.func.count(sa.case((UserGame.favorite, 1))),
+        )
+        .outerjoin(UserGame)
+        .group_by(GameTable.id)
+    )
+    result = {slug: Stats() for slug in get_slugs()}
+    with app.session() as s:
+        for slug, members, favorites in s.execute(query):
+            result[slug] = Stats(members=members, favorites=favorites)
 
+    # Do not cache a result that may predate a concurrent invalidation
+    if version == _stats_version:
+        _stats = result
+        _stats_expires = time.monotonic() + config.GAMES_STATS_TTL
+    return result
 
-def get_popular(limit=10, sort=None) -> list[Game]:
-    return [game for game in get_all(sort=sort) if game.popular][:limit]
+
+def invalidate_stats():
+    """Must be called after any change to UserGame rows"""
+    global _stats, _stats_version
+    _stats_version += 1
+    _stats = None
 
 
 def populate():
     from app import app
 
     with app.session() as s:
+        existing = set(s.scalars(sa.select(GameTable.slug)))
         for game in get_all():
-            if not game.db:
+            if game.slug not in existing:
                 s.add(GameTable(slug=game.slug))
                 logging.info(f"Populating DB with game {game}")
         s.commit()
 
 
+@data.on_reload
+def on_data_reload(snapshot):
+    populate()
+    invalidate_stats()
+
+
 def add_to_list(slug: str, user: User, discord=True) -> bool:
     from app import app
     from app.services import discord as discord_service
@@ -210,6 +323,7 @@ def add_to_list(slug: str, user: User, discord=True) -> bool:
         )
         if action.created:
             s.commit()
+            invalidate_stats()
             audit.log(f"Game {game} added to {user}")
             if discord:
                 discord_service.add_game(user, game)
@@ -227,6 +341,7 @@ def remove_from_list(slug: str, user: User, discord=True) -> bool:
         if exists:
             query.delete()
             s.commit()
+            invalidate_stats()
             audit.log(f"Game {game} removed to {user}")
             if discord:
                 discord_service.remove_game(user, game)
@@ -247,6 +362,7 @@ def set_favorite(slug: str, user: User, favorite: bool) -> bool:
         if different:
             instance.favorite = favorite
             s.commit()
+            invalidate_stats()
             audit.log(f"Game {game} favorite set to {favorite} for {user}")
     return different
 
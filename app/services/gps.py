@@ -1,28 +1,105 @@
 import csv
+import dataclasses
+import gzip
+import hashlib
+import json
 import logging
 from dataclasses import dataclass
+from datetime import UTC, datetime
 from io import StringIO
+from pathlib import Path
 
-import requests
+import flask
+import sqlalchemy as sa
+import unidecode
 from pydantic import BaseModel, Field
 
-from app import ROOT_DIR, app
+from app import ROOT_DIR, app, config
 from app.db import MapPoint
+from app.services import topology
+from app.services.http_client import client
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Datasets committed with the code, see refresh_geodata
+GEODATA_DIR = ROOT_DIR / "geodata"
+GEODATA_MANIFEST = GEODATA_DIR / "manifest.json"
+# Bump when the format of the vendored files changes
+GEODATA_VERSION = 1
+MAP_POINTS_PATH = GEODATA_DIR / "map_points.csv"
+REGIONS_SOURCE_PATH = GEODATA_DIR / "regions.geojson"
+# Decimals kept, 4 is about 10m
+COORDINATES_PRECISION = 4
+REGIONS_PRECISION = 4
 STATIC_DATA_DIR = ROOT_DIR / "static" / "data"
+REGIONS_MANIFEST = STATIC_DATA_DIR / "regions.json"
 
 
 def populate():
-    with app.session() as s:
-        if (
-            not s.query(MapPoint)
-            .filter_by(type=MapPoint.Type.Department)
-            .count()
-        ):
-            populate_departments()
-        if not s.query(MapPoint).filter_by(type=MapPoint.Type.Country).count():
-            populate_countries()
-    create_regions_topology()
+    """
+    Adds the vendored map points to the database and builds the regions
+    files. Without vendored datasets, they are downloaded and used without
+    being written to the code tree.
+    """
+    points = regions = None
+    if not GEODATA_MANIFEST.exists():
+        logging.warning(
+            "Vendored geodata is missing, downloading it, run"
+            " `flask seed gps --refresh` to vendor it"
+        )
+        points = get_map_points_from_api()
+        regions = get_regions_from_api()
+    created = load_map_points(points)
+    if created:
+        logging.info(f"Created {created} map points")
+    if not REGIONS_MANIFEST.exists():
+        build_regions_topology(regions)
+
+
+# Departments codes of each region, overseas departments are regions of their
+# own
+REGIONS = {
+    "Auvergne-Rhône-Alpes": "01 03 07 15 26 38 42 43 63 69 73 74".split(),
+    "Bourgogne-Franche-Comté": "21 25 39 58 70 71 89 90".split(),
+    "Bretagne": "22 29 35 56".split(),
+    "Centre-Val de Loire": "18 28 36 37 41 45".split(),
+    "Corse": "2A 2B".split(),
+    "Grand Est": "08 10 51 52 54 55 57 67 68 88".split(),
+    "Hauts-de-France": "02 59 60 62 80".split(),
+    "Île-de-France": "75 77 78 91 92 93 94 95".split(),
+    "Normandie": "14 27 50 61 76".split(),
+    "Nouvelle-Aquitaine": "16 17 19 23 24 33 40 47 64 79 86 87".split(),
+    "Occitanie": "09 11 12 30 31 32 34 46 48 65 66 81 82".split(),
+    "Pays de la Loire": "44 49 53 72 85".split(),
+    "Provence-Alpes-Côte d'Azur": "04 05 06 13 83 84".split(),
+    "Guadeloupe": ["971"],
+    "Martinique": ["972"],
+    "Guyane": ["973"],
+    "La Réunion": ["974"],
+    "Mayotte": ["976"],
+}
+REGIONS_BY_DEPARTMENT = {
+    code: region for region, codes in REGIONS.items() for code in codes
+}
+
+
+def get_region(point: MapPoint) -> str:
+    """Region of a department, countries are their own region"""
+    if point.type != MapPoint.Type.Department:
+        return point.name
+    code = point.name.split(" - ")[0]
+    return REGIONS_BY_DEPARTMENT.get(code, point.name)
+
+
+@dataclass
+class MapPointData:
+    name: str
+    type: MapPoint.Type
+    latitude: float
+    longitude: float
 
 
 class GeoAPIDepartment(BaseModel):
@@ -64,7 +141,7 @@ def get_departments_from_api():
     DEPARTMENTS_GPS_URL = "https://www.data.gouv.fr/fr/datasets/r/de8e4904-45f6-4a38-b3fc-efb03f8e75bf"  # noqa
 
     logging.info("Fetching departments from API")
-    departments_list = requests.get(DEPARTMENTS_LIST_URL)
+    departments_list = client.get(DEPARTMENTS_LIST_URL)
     departments_list.raise_for_status()
     logging.info("Done")
     departments_list = [
@@ -72,7 +149,7 @@ def get_departments_from_api():
     ]
 
     logging.info("Fetching departments GPS from data gouv dataset")
-    departments_gps = requests.get(DEPARTMENTS_GPS_URL)
+    departments_gps = client.get(DEPARTMENTS_GPS_URL)
     departments_gps.raise_for_status()
     logging.info("Done")
     departments_gps = csv.reader(StringIO(departments_gps.text))
@@ -100,53 +177,141 @@ def get_departments_from_api():
     ]
 
 
-def create_regions_topology(force=False):
-    PATH = STATIC_DATA_DIR / "regions.topojson"
+def get_regions_from_api() -> dict:
+    """Departments borders, without the properties and precision not used"""
     TOPOLOGY_URL = "https://www.data.gouv.fr/fr/datasets/r/92f37c92-3aae-452c-8af1-c77e6dd590e5"  # noqa
 
-    if PATH.exists() and not force:
-        return
-
-    regions = requests.get(TOPOLOGY_URL)
+    logging.info("Fetching regions from data gouv dataset")
+    regions = client.get(TOPOLOGY_URL)
     regions.raise_for_status()
+    regions = regions.json()
+
+    def round_coordinates(value):
+        if isinstance(value, list):
+            return [round_coordinates(x) for x in value]
+        return round(value, REGIONS_PRECISION)
+
+    for feature in regions["features"]:
+        properties = feature["properties"]
+        feature["properties"] = {
+            key: properties[key] for key in ("dep", "libgeo")
+        }
+        geometry = feature["geometry"]
+        geometry["coordinates"] = round_coordinates(geometry["coordinates"])
+    return regions
+
+
+def is_overseas(code: str) -> bool:
+    """Overseas departments are too far to be shown with the others"""
+    return len(code) == 3 and code.startswith("97")
+
+
+def compress(path: Path):
+    """Writes gzip and, when available, brotli variants next to `path`"""
+    content = path.read_bytes()
+    path.with_name(path.name + ".gz").write_bytes(
+        gzip.compress(content, compresslevel=9, mtime=0)
+    )
+    if brotli is not None:
+        path.with_name(path.name + ".br").write_bytes(
+            brotli.compress(content, quality=11)
+        )
+
+
+def build_regions_topology(source: dict = None) -> dict:
+    """
+    Simplified and quantized versions of the vendored regions, or of
+    `source`, one per zoom level of MAP_REGIONS_LEVELS, named after their
+    content so that they can be cached forever. Returns the new manifest.
+    """
+    if source is None:
+        with open(REGIONS_SOURCE_PATH) as f:
+            source = json.load(f)
+    STATIC_DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+    for old in STATIC_DATA_DIR.glob("regions.z*.topojson*"):
+        old.unlink()
+
+    levels = []
+    for zoom, tolerance in sorted(config.MAP_REGIONS_LEVELS.items()):
+        result = topology.from_geojson(
+            source,
+            tolerance=tolerance,
+            quantization=config.MAP_REGIONS_QUANTIZATION,
+            name="regions",
+            filter=lambda x: not is_overseas(str(x["properties"]["dep"])),
+        )
+        content = json.dumps(result, separators=(",", ":")).encode()
+        hash = hashlib.sha256(content).hexdigest()[:12]
+        path = STATIC_DATA_DIR / f"regions.z{zoom}.{hash}.topojson"
+        path.write_bytes(content)
+        compress(path)
+        levels.append({"min_zoom": zoom, "file": path.name})
+        logging.info(f"Built {path.name}, {len(content)} bytes")
+
+    manifest = {"levels": levels}
+    with open(REGIONS_MANIFEST, "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def get_regions_levels() -> list[dict]:
+    """Built regions files with the zoom from which they are used"""
+    global _regions_manifest
+    try:
+        mtime = REGIONS_MANIFEST.stat().st_mtime_ns
+    except FileNotFoundError:
+        return []
+    if _regions_manifest is None or _regions_manifest[0] != mtime:
+        with open(REGIONS_MANIFEST) as f:
+            _regions_manifest = (mtime, json.load(f))
+    return _regions_manifest[1]["levels"]
 
-    PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(PATH, "w") as f:
-        f.write(regions.text)
-
-
-def populate_departments():
-    created = []
-    for department in get_departments_from_api():
-        with app.session() as s:
-            if s.greate(
-                MapPoint,
-                filter={"name": department.display_name},
-                defaults={
-                    "type": MapPoint.Type.Department,
-                    "longitude": department.gps[1],
-                    "latitude": department.gps[0],
-                },
-            ).created:
-                created.append(department)
-                logging.info(f"Created {department}")
-                s.commit()
-    return created
-
-
-def populate_countries():
+
+_regions_manifest: tuple[int, dict] = None
+
+
+def send_regions_file(name: str) -> flask.Response:
+    """
+    Built regions file, precompressed if the client accepts it. Its name
+    changes with its content, so it is cached without revalidation.
+    """
+    if name not in {level["file"] for level in get_regions_levels()}:
+        flask.abort(404)
+    path = STATIC_DATA_DIR / name
+    max_age = 365 * 24 * 3600
+    encodings = flask.request.accept_encodings
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        variant = path.with_name(path.name + suffix)
+        if encodings[encoding] and variant.exists():
+            response = flask.send_file(
+                variant, mimetype="application/json", max_age=max_age
+            )
+            response.content_encoding = encoding
+            break
+    else:
+        response = flask.send_file(
+            path, mimetype="application/json", max_age=max_age
+        )
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def get_countries_from_api() -> list[MapPointData]:
     COUNTRIES_URL = "https://gist.github.com/metal3d/5b925077e66194551df949de64e910f6/raw/c5f20a037409d96958553e2eb6b8251265c6fd63/country-coord.csv"  # noqa
     COUNTRIES_ISO_TO_FRENCH_URL = "https://gist.github.com/lneveu/cdb444b0e609ed81d3ad1f5907cda6f8/raw/8ad6e298e55284b074dcd716da2d3b25904c29f8/iso-3166_country_french.json"  # noqa
 
-    countries = requests.get(COUNTRIES_URL)
+    countries = client.get(COUNTRIES_URL)
     countries.raise_for_status()
 
-    countries_names = requests.get(COUNTRIES_ISO_TO_FRENCH_URL)
+    countries_names = client.get(COUNTRIES_ISO_TO_FRENCH_URL)
     countries_names.raise_for_status()
     countries_names = countries_names.json()
 
     countries = csv.DictReader(StringIO(countries.text))
-    created = []
+    result = []
     droms = {
         "GP": "971 - Guadeloupe",
         "MQ": "972 - Martinique",
@@ -154,30 +319,121 @@ def populate_countries():
         "RE": "974 - Réunion",
         "YT": "976 - Mayotte",
     }
+    for country in countries:
+        code = country["Alpha-2 code"]
+        if code == "FR":
+            continue
+        if code in droms:
+            name = droms[code]
+            type = MapPoint.Type.Department
+        else:
+            name = countries_names.get(code)
+            type = MapPoint.Type.Country
+        if not name:
+            logging.warning(f"Skipping {country}, no name")
+            continue
+        result.append(
+            MapPointData(
+                name=name,
+                type=type,
+                latitude=float(country["Latitude (average)"]),
+                longitude=float(country["Longitude (average)"]),
+            )
+        )
+    return result
+
+
+def get_map_points_from_api() -> list[MapPointData]:
+    result = {}
+    departments = [
+        MapPointData(
+            name=department.display_name,
+            type=MapPoint.Type.Department,
+            latitude=department.gps[0],
+            longitude=department.gps[1],
+        )
+        for department in get_departments_from_api()
+    ]
+    # Departments from the API win over overseas ones from the countries list
+    for point in departments + get_countries_from_api():
+        result.setdefault(point.name, point)
+    return list(result.values())
+
+
+def get_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def refresh_geodata():
+    """Downloads the datasets again and replaces the vendored files"""
+    points = get_map_points_from_api()
+    regions = get_regions_from_api()
+
+    GEODATA_DIR.mkdir(parents=True, exist_ok=True)
+    points.sort(key=lambda x: (x.type.name, unidecode.unidecode(x.name)))
+    with open(MAP_POINTS_PATH, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["name", "type", "latitude", "longitude"])
+        for point in points:
+            writer.writerow(
+                [
+                    point.name,
+                    point.type.name,
+                    round(point.latitude, COORDINATES_PRECISION),
+                    round(point.longitude, COORDINATES_PRECISION),
+                ]
+            )
+    with open(REGIONS_SOURCE_PATH, "w") as f:
+        json.dump(regions, f, ensure_ascii=False, separators=(",", ":"))
+
+    manifest = {
+        "version": GEODATA_VERSION,
+        "updated": datetime.now(UTC).date().isoformat(),
+        "files": {
+            path.name: get_hash(path)
+            for path in (MAP_POINTS_PATH, REGIONS_SOURCE_PATH)
+        },
+    }
+    with open(GEODATA_MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+
+
+def read_map_points() -> list[MapPointData]:
+    with open(GEODATA_MANIFEST) as f:
+        manifest = json.load(f)
+    if manifest["version"] != GEODATA_VERSION:
+        raise ValueError(
+            f"Vendored geodata version {manifest['version']} is not supported,"
+            " run flask seed gps --refresh"
+        )
+    with open(MAP_POINTS_PATH, newline="") as f:
+        return [
+            MapPointData(
+                name=row["name"],
+                type=MapPoint.Type[row["type"]],
+                latitude=float(row["latitude"]),
+                longitude=float(row["longitude"]),
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def load_map_points(points: list[MapPointData] = None) -> int:
+    """
+    Inserts the vendored map points, or `points`, missing from the database,
+    in a single transaction. Returns how many were created.
+    """
+    if points is None:
+        points = read_map_points()
     with app.session() as s:
-        for country in countries:
-            code = country["Alpha-2 code"]
-            if code == "FR":
-                continue
-            if code in droms:
-                name = droms[code]
-                type = MapPoint.Type.Department
-            else:
-                name = countries_names.get(code)
-                type = MapPoint.Type.Country
-            if not name:
-                logging.warning(f"Skipping {country}, no name")
-                continue
-            if s.greate(
-                MapPoint,
-                filter={"name": name},
-                defaults={
-                    "type": type,
-                    "longitude": float(country["Longitude (average)"]),
-                    "latitude": float(country["Latitude (average)"]),
-                },
-            ).created:
-                created.append(country)
-                logging.info(f"Created {country}")
-                s.commit()
-    return created
+        existing = set(s.scalars(sa.select(MapPoint.name)))
+        missing = [
+            dataclasses.asdict(point)
+            for point in points
+            if point.name not in existing
+        ]
+        if missing:
+            s.execute(sa.insert(MapPoint), missing)
+            s.commit()
+    return len(missing)
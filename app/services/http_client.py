@@ -0,0 +1,126 @@
+import http.cookiejar
+import logging
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app import config
+
+
+@dataclass
+class HostMetrics:
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    total_time: float = 0
+    max_time: float = 0
+
+    @property
+    def average_time(self) -> float:
+        return self.total_time / self.requests if self.requests else 0
+
+    def __str__(self):
+        return (
+            f"{self.requests} requests, {self.errors} errors,"
+            f" {self.retries} retries,"
+            f" {self.average_time * 1000:.0f}ms average,"
+            f" {self.max_time * 1000:.0f}ms max"
+        )
+
+
+class DeadlineRetry(Retry):
+    """Retry that gives up once the deadline of the current request passed"""
+
+    local = threading.local()
+
+    def is_exhausted(self) -> bool:
+        deadline = getattr(self.local, "deadline", None)
+        if deadline is not None and time.monotonic() >= deadline:
+            return True
+        return super().is_exhausted()
+
+
+class Client:
+    """
+    Outbound HTTP requests of every service. Connections are kept alive in a
+    pool per host, requests time out after HTTP_TIMEOUT, idempotent ones are
+    retried with exponential backoff on connection errors and 502/503/504
+    until HTTP_RETRIES_DEADLINE, and latency and errors are counted per host.
+    Rate limits are left to callers, 429 responses are not retried.
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        # Responses of one user must not leak into requests of another one
+        self.session.cookies.set_policy(
+            http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+        )
+        retry = DeadlineRetry(
+            total=config.HTTP_RETRIES,
+            backoff_factor=config.HTTP_BACKOFF,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=config.HTTP_POOL_HOSTS,
+            pool_maxsize=config.HTTP_POOL_SIZE,
+            max_retries=retry,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.metrics: dict[str, HostMetrics] = {}
+        self.lock = threading.Lock()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", tuple(config.HTTP_TIMEOUT))
+        host = urllib.parse.urlsplit(url).netloc
+        start = time.perf_counter()
+        error = True
+        retries = 0
+        DeadlineRetry.local.deadline = (
+            time.monotonic() + config.HTTP_RETRIES_DEADLINE
+        )
+        try:
+            response = self.session.request(method, url, **kwargs)
+            error = response.status_code >= 500
+            if response.raw is not None and response.raw.retries:
+                retries = len(response.raw.retries.history)
+            return response
+        finally:
+            DeadlineRetry.local.deadline = None
+            self.record(host, time.perf_counter() - start, error, retries)
+
+    def record(self, host: str, duration: float, error: bool, retries: int):
+        with self.lock:
+            metrics = self.metrics.setdefault(host, HostMetrics())
+            metrics.requests += 1
+            metrics.errors += error
+            metrics.retries += retries
+            metrics.total_time += duration
+            metrics.max_time = max(metrics.max_time, duration)
+
+    def pop_metrics(self) -> dict[str, HostMetrics]:
+        """Metrics since the previous call"""
+        with self.lock:
+            result, self.metrics = self.metrics, {}
+        return result
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+client = Client()
+
+
+def log_metrics():
+    for host, metrics in sorted(client.pop_metrics().items()):
+        logging.info(f"HTTP {host}: {metrics}")
@@ -5,10 +5,10 @@ import datetime
 import typing as t
 from enum import Enum
 
-import requests
 from pydantic import BaseModel as Model
 
 from app import config
+from app.services.http_client import client
 
 API_URL = "https://api.igdb.com/v4/"
 TWITCH_AUTH_URL = "https://id.twitch.tv/oauth2/token"
@@ -32,9 +32,9 @@ class API:
         if not self.client_id or not self.client_secret:
             raise Exception("Missing Twitch client_id or client_secret")
 
-        response = requests.post(
+        response = client.post(
             TWITCH_AUTH_URL,
-            {
+            data={
                 "client_id": self.client_id,
                 "client_secret": self.client_secret,
                 "grant_type": "client_credentials",
@@ -45,9 +45,9 @@ class API:
         return self.auth_token
 
     def request(self, endpoint: str, *commands: str):
-        result = requests.post(
+        result = client.post(
             f"{API_URL}{endpoint}",
-            ";".join(commands) + ";",
+            data=";".join(commands) + ";",
             headers={
                 "Authorization": f"Bearer {self.auth_token}",
                 "Client-ID": self.client_id,
@@ -0,0 +1,263 @@
+import dataclasses
+import functools
+import hashlib
+import json
+import threading
+import time
+import typing as t
+from dataclasses import dataclass
+
+import flask
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from app import app, config
+from app.db import MapPoint, Session, User
+from app.services import gps
+from app.services import user as user_service
+
+
+@dataclass(frozen=True)
+class Payload:
+    body: bytes
+    etag: str
+    version: int
+    expires: float
+
+
+class ChangeCounter:
+    """
+    Incremented after each commit that modifies users or map points, so that
+    data derived from them can tell when it is outdated.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def increment(self):
+        with self.lock:
+            self.value += 1
+
+
+changes = ChangeCounter()
+
+
+@sa.event.listens_for(Session, "after_flush")
+def _collect_map_changes(session, flush_context):
+    if any(
+        isinstance(instance, (User, MapPoint))
+        for instance in (*session.new, *session.dirty, *session.deleted)
+    ):
+        session.info["map_changed"] = True
+
+
+@sa.event.listens_for(Session, "after_commit")
+def _count_map_changes(session):
+    if session.info.pop("map_changed", False):
+        changes.increment()
+
+
+@sa.event.listens_for(Session, "after_rollback")
+def _forget_map_changes(session):
+    session.info.pop("map_changed", False)
+
+
+def get_users(session) -> list[User]:
+    """Public users with a map point, loaded with it in a single query"""
+    query = user_service.filter_public(session.query(User))
+    return (
+        query.join(User.map_point)
+        .options(orm.contains_eager(User.map_point))
+        .order_by(User.id)
+        .all()
+    )
+
+
+def get_feature(user: User) -> dict:
+    point = user.map_point
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [point.longitude, point.latitude],
+        },
+        "properties": {
+            "map_point": point.name,
+            "map_point_id": point.id,
+            "name": user.name,
+            "icon": user.avatar_url,
+            "link": flask.url_for("user", login=user.login),
+        },
+    }
+
+
+def build_users() -> dict:
+    with app.session() as s:
+        features = [get_feature(user) for user in get_users(s)]
+    return {"type": "FeatureCollection", "features": features}
+
+
+@dataclass
+class Group:
+    """Users of one or several map points, shown as a single marker"""
+
+    name: str
+    latitude: float
+    longitude: float
+    count: int
+    avatars: list[str]
+    points: list[int]
+
+
+def get_counts(session) -> list[tuple[MapPoint, int]]:
+    """Map points with the number of public users on each of them"""
+    query = session.query(MapPoint, sa.func.count(User.id)).join(
+        User, User.map_point_id == MapPoint.id
+    )
+    return (
+        user_service.filter_public(query)
+        .group_by(MapPoint.id)
+        .order_by(MapPoint.id)
+        .all()
+    )
+
+
+def get_samples(session, size: int) -> dict[int, list[User]]:
+    """First `size` public users of each map point"""
+    rank = sa.func.row_number().over(
+        partition_by=User.map_point_id, order_by=User.id
+    )
+    ranked = (
+        user_service.filter_public(session.query(User.id, rank.label("rank")))
+        .filter(User.map_point_id.isnot(None))
+        .subquery()
+    )
+    users = (
+        session.query(User)
+        .join(ranked, ranked.c.id == User.id)
+        .filter(ranked.c.rank <= size)
+        .order_by(User.id)
+    )
+    result = {}
+    for user in users:
+        result.setdefault(user.map_point_id, []).append(user)
+    return result
+
+
+def get_point_groups(session) -> list[tuple[MapPoint, Group]]:
+    samples = get_samples(session, config.MAP_GROUP_SAMPLE_SIZE)
+    return [
+        (
+            point,
+            Group(
+                name=point.name,
+                latitude=point.latitude,
+                longitude=point.longitude,
+                count=count,
+                avatars=[user.avatar_url for user in samples.get(point.id, [])],
+                points=[point.id],
+            ),
+        )
+        for point, count in get_counts(session)
+    ]
+
+
+def get_region_groups(session) -> list[tuple[str, Group]]:
+    """Point groups merged per region, placed at the middle of its points"""
+    by_region: dict[str, list[Group]] = {}
+    for point, group in get_point_groups(session):
+        by_region.setdefault(gps.get_region(point), []).append(group)
+
+    result = []
+    for name, groups in by_region.items():
+        avatars = [avatar for group in groups for avatar in group.avatars]
+        group = Group(
+            name=name,
+            latitude=sum(x.latitude for x in groups) / len(groups),
+            longitude=sum(x.longitude for x in groups) / len(groups),
+            count=sum(x.count for x in groups),
+            avatars=avatars[: config.MAP_GROUP_SAMPLE_SIZE],
+            points=[id for group in groups for id in group.points],
+        )
+        result.append((name, group))
+    return result
+
+
+def build_groups(level: str) -> dict:
+    get_groups = {"points": get_point_groups, "regions": get_region_groups}
+    with app.session() as s:
+        groups = get_groups[level](s)
+    return {"groups": [dataclasses.asdict(group) for _, group in groups]}
+
+
+def get_point(id: int) -> dict | None:
+    """Public users of a map point"""
+    with app.session() as s:
+        point = s.get(MapPoint, id)
+        if not point:
+            return None
+        query = user_service.filter_public(s.query(User))
+        users = query.filter(User.map_point_id == id).order_by(User.id)
+        return {
+            "id": point.id,
+            "name": point.name,
+            "users": [
+                {
+                    "name": user.name,
+                    "icon": user.avatar_url,
+                    "link": flask.url_for("user", login=user.login),
+                }
+                for user in users
+            ],
+        }
+
+
+def encode(data, version: int) -> Payload:
+    body = json.dumps(data, separators=(",", ":")).encode()
+    return Payload(
+        body=body,
+        etag=hashlib.sha256(body).hexdigest()[:32],
+        version=version,
+        expires=time.monotonic() + config.MAP_CACHE_TTL,
+    )
+
+
+_payloads: dict[str, Payload] = {}
+
+
+def get_payload(name: str, build: t.Callable[[], t.Any]) -> Payload:
+    """
+    Encoded result of `build`, rebuilt after changes made by this process or
+    after MAP_CACHE_TTL seconds for changes made by other ones.
+    """
+    current = _payloads.get(name)
+    if (
+        current
+        and current.version == changes.value
+        and current.expires > time.monotonic()
+    ):
+        return current
+    # Read before building, a change made meanwhile triggers another build
+    version = changes.value
+    _payloads[name] = encode(build(), version)
+    return _payloads[name]
+
+
+def get_users_payload() -> Payload:
+    """GeoJSON of the public users, needs a request context to build URLs"""
+    return get_payload("users", build_users)
+
+
+def get_groups_payload(level: str) -> Payload:
+    """Users counts per map point or per region, with a few avatars"""
+    return get_payload(level, functools.partial(build_groups, level))
+
+
+def respond(payload: Payload, mimetype="application/json") -> flask.Response:
+    """Response that browsers revalidate using the payload ETag"""
+    response = flask.Response(payload.body, mimetype=mimetype)
+    response.set_etag(payload.etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(flask.request)
@@ -0,0 +1,108 @@
+import sqlalchemy as sa
+import unidecode
+
+from app import app
+from app.db import Session, User, UserSearch
+
+COLUMNS = ("login", "display_name", "bio")
+# The trigram tokenizer can not use its index for shorter queries
+MIN_MATCH_LENGTH = 3
+
+
+def normalize(text: str | None) -> str:
+    """Same normalization as MapPoint.name_normalized"""
+    return unidecode.unidecode(text or "").lower()
+
+
+def get_values(user: User) -> dict:
+    return {
+        "rowid": user.id,
+        **{key: normalize(getattr(user, key)) for key in COLUMNS},
+    }
+
+
+def delete(connection, ids: list[int]):
+    if ids:
+        connection.execute(
+            sa.delete(UserSearch).where(UserSearch.c.rowid.in_(ids))
+        )
+
+
+def index(connection, users: list[User]):
+    """Replaces the index entries of `users`"""
+    delete(connection, [user.id for user in users])
+    if users:
+        connection.execute(
+            sa.insert(UserSearch), [get_values(user) for user in users]
+        )
+
+
+def rebuild():
+    """Indexes every user again, in case the index is out of sync"""
+    with app.session() as s:
+        connection = s.connection()
+        connection.execute(sa.delete(UserSearch))
+        index(connection, s.query(User).all())
+        s.commit()
+
+
+def has_changes(user: User) -> bool:
+    attrs = sa.inspect(user).attrs
+    return any(attrs[key].history.has_changes() for key in COLUMNS)
+
+
+@sa.event.listens_for(Session, "after_flush")
+def on_flush(session, flush_context):
+    """Keeps the index in sync, in the same transaction as the changes"""
+    users = [x for x in session.new if isinstance(x, User)]
+    users += [
+        x for x in session.dirty if isinstance(x, User) and has_changes(x)
+    ]
+    deleted = [x.id for x in session.deleted if isinstance(x, User)]
+    if not users and not deleted:
+        return
+    connection = session.connection()
+    index(connection, users)
+    delete(connection, deleted)
+
+
+def quote(query: str) -> str:
+    """Query as a single FTS5 phrase, so that its syntax is not interpreted"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def match(query: str) -> sa.Select:
+    """
+    Ids of users whose login, display name or bio contains `query`, ignoring
+    case and accents, with a `score` column that is lower for better matches.
+    """
+    query = normalize(query).strip()
+    if len(query) >= MIN_MATCH_LENGTH:
+        return sa.select(
+            UserSearch.c.rowid, sa.literal_column("rank").label("score")
+        ).where(
+            sa.text("users_search MATCH :query").bindparams(query=quote(query))
+        )
+    escaped = query.replace("\\", "\\\\")
+    escaped = escaped.replace("%", "\\%").replace("_", "\\_")
+    return sa.select(UserSearch.c.rowid, sa.literal(0).label("score")).where(
+        sa.or_(
+            *(
+                UserSearch.c[key].like(f"%{escaped}%", escape="\\")
+                for key in COLUMNS
+            )
+        )
+    )
+
+
+def search(session, query: str, limit: int = 10) -> list[User]:
+    """Public users matching `query`, best matches first"""
+    matches = match(query).subquery()
+    return (
+        session.query(User)
+        .join(matches, matches.c.rowid == User.id)
+        .filter(User.hide_in_list.is_(False))
+        .order_by(matches.c.score, User.login)
+        .limit(limit)
+        .all()
+    )
@@ -0,0 +1,35 @@
+from datetime import UTC, datetime
+
+import sqlalchemy as sa
+from flask_session.sqlalchemy import SqlAlchemySessionInterface
+
+from app import app
+
+
+def prune(batch_size=1000) -> int:
+    """
+    Deletes expired server-side sessions, in batches to keep write locks
+    short. Returns the number of deleted sessions.
+    """
+    interface = app.session_interface
+    # Other backends expire sessions by themselves
+    if not isinstance(interface, SqlAlchemySessionInterface):
+        return 0
+
+    model = interface.sql_session_model
+    now = datetime.now(UTC).replace(tzinfo=None)
+    total = 0
+    with app.app_context():
+        session = interface.client.session
+        while True:
+            expired = (
+                sa.select(model.id).where(model.expiry <= now).limit(batch_size)
+            )
+            result = session.execute(
+                sa.delete(model).where(model.id.in_(expired))
+            )
+            session.commit()
+            total += result.rowcount
+            if result.rowcount < batch_size:
+                break
+    return total
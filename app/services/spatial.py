@@ -0,0 +1,216 @@
+import math
+import time
+import typing as t
+from dataclasses import dataclass
+
+from app import app, config
+from app.db import MapPoint, User
+from app.services import map as map_service
+from app.services import user as user_service
+
+EARTH_RADIUS_KM = 6371.0088
+
+Vector = tuple[float, float, float]
+
+
+@dataclass(frozen=True)
+class IndexedPoint:
+    id: int
+    name: str
+    latitude: float
+    longitude: float
+
+
+def to_vector(latitude: float, longitude: float) -> Vector:
+    """
+    Position on the unit sphere, straight line distances between positions
+    grow with great-circle distances
+    """
+    lat, lng = math.radians(latitude), math.radians(longitude)
+    return (
+        math.cos(lat) * math.cos(lng),
+        math.cos(lat) * math.sin(lng),
+        math.sin(lat),
+    )
+
+
+def get_chord(km: float) -> float:
+    """Straight line distance on the unit sphere for a great-circle distance"""
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def haversine(
+    latitude: float, longitude: float, points: t.Sequence[IndexedPoint]
+) -> list[float]:
+    """Great-circle distances in km from one position to many points"""
+    lat, lng = math.radians(latitude), math.radians(longitude)
+    cos_lat = math.cos(lat)
+    lats = [math.radians(point.latitude) for point in points]
+    lngs = [math.radians(point.longitude) for point in points]
+    return [
+        2
+        * EARTH_RADIUS_KM
+        * math.asin(
+            math.sqrt(
+                math.sin((y - lat) / 2) ** 2
+                + cos_lat * math.cos(y) * math.sin((x - lng) / 2) ** 2
+            )
+        )
+        for y, x in zip(lats, lngs)
+    ]
+
+
+class KDTree:
+    """k-d tree of unit sphere vectors, nodes are (vector, item, left, right)"""
+
+    def __init__(self, items: t.Iterable[tuple[Vector, t.Any]]):
+        self.root = self.build(list(items), 0)
+
+    @classmethod
+    def build(cls, items: list, depth: int):
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda x: x[0][axis])
+        middle = len(items) // 2
+        vector, item = items[middle]
+        return (
+            vector,
+            item,
+            cls.build(items[:middle], depth + 1),
+            cls.build(items[middle + 1 :], depth + 1),
+        )
+
+    @staticmethod
+    def get_distance(a: Vector, b: Vector) -> float:
+        return math.dist(a, b)
+
+    def nearest(self, target: Vector) -> t.Any:
+        best = [None, math.inf]
+
+        def visit(node, depth):
+            if node is None:
+                return
+            vector, item, left, right = node
+            distance = self.get_distance(vector, target)
+            if distance < best[1]:
+                best[:] = item, distance
+            difference = target[depth % 3] - vector[depth % 3]
+            near, far = (left, right) if difference < 0 else (right, left)
+            visit(near, depth + 1)
+            if abs(difference) < best[1]:
+                visit(far, depth + 1)
+
+        visit(self.root, 0)
+        return best[0]
+
+    def within(self, target: Vector, radius: float) -> list:
+        result = []
+        stack = [(self.root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if node is None:
+                continue
+            vector, item, left, right = node
+            if self.get_distance(vector, target) <= radius:
+                result.append(item)
+            difference = target[depth % 3] - vector[depth % 3]
+            if difference <= radius:
+                stack.append((left, depth + 1))
+            if difference >= -radius:
+                stack.append((right, depth + 1))
+        return result
+
+
+class PointIndex:
+    def __init__(self, points: list[IndexedPoint], version: int):
+        self.points = {point.id: point for point in points}
+        self.tree = KDTree(
+            (to_vector(point.latitude, point.longitude), point)
+            for point in points
+        )
+        self.version = version
+        self.expires = time.monotonic() + config.MAP_CACHE_TTL
+
+    def nearest(
+        self, latitude: float, longitude: float
+    ) -> tuple[IndexedPoint, float] | None:
+        point = self.tree.nearest(to_vector(latitude, longitude))
+        if point is None:
+            return None
+        return point, haversine(latitude, longitude, [point])[0]
+
+    def within(
+        self, latitude: float, longitude: float, km: float
+    ) -> list[tuple[IndexedPoint, float]]:
+        """Points at most `km` away, nearest first"""
+        points = self.tree.within(to_vector(latitude, longitude), get_chord(km))
+        distances = haversine(latitude, longitude, points)
+        result = [
+            (point, distance)
+            for point, distance in zip(points, distances)
+            if distance <= km
+        ]
+        return sorted(result, key=lambda x: x[1])
+
+
+_index: PointIndex = None
+
+
+def get_index() -> PointIndex:
+    """
+    Index of every map point, rebuilt after changes made by this process or
+    after MAP_CACHE_TTL seconds.
+    """
+    global _index
+    current = _index
+    changes = map_service.changes.value
+    if (
+        current
+        and current.version == changes
+        and current.expires > time.monotonic()
+    ):
+        return current
+    with app.session() as s:
+        points = [
+            IndexedPoint(
+                id=point.id,
+                name=point.name,
+                latitude=point.latitude,
+                longitude=point.longitude,
+            )
+            for point in s.query(MapPoint)
+        ]
+    _index = PointIndex(points, changes)
+    return _index
+
+
+def get_nearest_point(
+    latitude: float, longitude: float
+) -> tuple[IndexedPoint, float] | None:
+    """Nearest map point with its distance in km"""
+    return get_index().nearest(latitude, longitude)
+
+
+def get_members_within(
+    point_id: int, km: float
+) -> tuple[IndexedPoint, list[tuple[User, float]]] | None:
+    """
+    Public users whose map point is at most `km` away from the given one,
+    nearest first, with their distance in km.
+    """
+    index = get_index()
+    center = index.points.get(point_id)
+    if center is None:
+        return None
+    distances = {
+        point.id: distance
+        for point, distance in index.within(
+            center.latitude, center.longitude, km
+        )
+    }
+    with app.session() as s:
+        query = user_service.filter_public(s.query(User))
+        users = query.filter(User.map_point_id.in_(distances)).all()
+    users.sort(key=lambda user: (distances[user.map_point_id], user.id))
+    return center, [(user, distances[user.map_point_id]) for user in users]
@@ -0,0 +1,207 @@
+"""
+Conversion of GeoJSON polygons to simplified and quantized TopoJSON. Borders
+shared by neighbouring polygons are stored, and simplified, once so that no
+gaps appear between them.
+"""
+
+import math
+import typing as t
+
+Point = tuple[float, float]
+Ring = list[Point]
+
+
+def get_polygons(geometry: dict) -> list[list[Ring]]:
+    if geometry["type"] == "Polygon":
+        coordinates = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        coordinates = geometry["coordinates"]
+    else:
+        raise ValueError(f"Unsupported geometry {geometry['type']}")
+    return [
+        [[(x, y) for x, y, *_ in ring] for ring in polygon]
+        for polygon in coordinates
+    ]
+
+
+def get_junctions(rings: list[Ring]) -> set[Point]:
+    """
+    Points where a border stops being shared with the same neighbours, rings
+    are cut there so that each shared part becomes its own arc.
+    """
+    neighbours: dict[Point, tuple[Point, Point]] = {}
+    junctions = set()
+    for ring in rings:
+        for i, point in enumerate(ring[:-1]):
+            pair = (ring[i - 1] if i else ring[-2], ring[i + 1])
+            seen = neighbours.setdefault(point, pair)
+            if seen != pair and seen != pair[::-1]:
+                junctions.add(point)
+    return junctions
+
+
+def cut(ring: Ring, junctions: set[Point]) -> list[Ring]:
+    indexes = [i for i, point in enumerate(ring[:-1]) if point in junctions]
+    if not indexes:
+        # Rotate to a canonical start so that identical rings are deduplicated
+        start = ring.index(min(ring[:-1]))
+        return [ring[start:-1] + ring[: start + 1]]
+    # Start from a junction, the ring closes on it
+    ring = ring[indexes[0] : -1] + ring[: indexes[0] + 1]
+    arcs = []
+    current = [ring[0]]
+    for point in ring[1:]:
+        current.append(point)
+        if point in junctions:
+            arcs.append(current)
+            current = [point]
+    return arcs
+
+
+def get_distance(point: Point, start: Point, end: Point) -> float:
+    """Distance from `point` to the segment from `start` to `end`"""
+    (x, y), (x1, y1), (x2, y2) = point, start, end
+    dx, dy = x2 - x1, y2 - y1
+    if not dx and not dy:
+        return math.hypot(x - x1, y - y1)
+    ratio = ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)
+    ratio = max(0, min(1, ratio))
+    return math.hypot(x - (x1 + ratio * dx), y - (y1 + ratio * dy))
+
+
+def simplify(arc: Ring, tolerance: float) -> Ring:
+    """Douglas-Peucker simplification, endpoints are always kept"""
+    if tolerance <= 0 or len(arc) < 3:
+        return arc
+    keep = [False] * len(arc)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(arc) - 1)]
+    while stack:
+        start, end = stack.pop()
+        farthest, distance = None, tolerance
+        for i in range(start + 1, end):
+            current = get_distance(arc[i], arc[start], arc[end])
+            if current > distance:
+                farthest, distance = i, current
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((start, farthest))
+            stack.append((farthest, end))
+    return [point for point, kept in zip(arc, keep) if kept]
+
+
+class Topology:
+    def __init__(self, quantization: int):
+        self.quantization = quantization
+        self.arcs: list[Ring] = []
+        self.indexes: dict[tuple[Point, ...], int] = {}
+
+    def add_arc(self, arc: Ring) -> int:
+        """Index of the arc, using TopoJSON ~index for reversed ones"""
+        key = tuple(arc)
+        if key in self.indexes:
+            return self.indexes[key]
+        reversed_key = key[::-1]
+        if reversed_key in self.indexes:
+            return ~self.indexes[reversed_key]
+        self.indexes[key] = len(self.arcs)
+        self.arcs.append(arc)
+        return self.indexes[key]
+
+    def simplify(self, tolerance: float, closed: set[int]):
+        result = []
+        for i, arc in enumerate(self.arcs):
+            simplified = simplify(arc, tolerance)
+            # Keep small islands from collapsing into lines
+            if i in closed and len(simplified) < 4:
+                simplified = arc
+            result.append(simplified)
+        self.arcs = result
+
+    def encode(self) -> tuple[dict, list[list[list[int]]]]:
+        """Quantized and delta-encoded arcs, with their transform"""
+        points = [point for arc in self.arcs for point in arc]
+        x0, y0 = min(x for x, _ in points), min(y for _, y in points)
+        x1, y1 = max(x for x, _ in points), max(y for _, y in points)
+        steps = self.quantization - 1
+        kx = (x1 - x0) / steps or 1
+        ky = (y1 - y0) / steps or 1
+
+        arcs = []
+        for arc in self.arcs:
+            encoded = []
+            previous = None
+            for x, y in arc:
+                point = (round((x - x0) / kx), round((y - y0) / ky))
+                if point == previous:
+                    continue
+                if previous is None:
+                    encoded.append(list(point))
+                else:
+                    encoded.append(
+                        [point[0] - previous[0], point[1] - previous[1]]
+                    )
+                previous = point
+            if len(encoded) < 2:
+                encoded.append([0, 0])
+            arcs.append(encoded)
+        transform = {"scale": [kx, ky], "translate": [x0, y0]}
+        return transform, arcs
+
+
+def from_geojson(
+    collection: dict,
+    tolerance: float,
+    quantization: int,
+    name: str = "features",
+    filter: t.Callable[[dict], bool] = None,
+) -> dict:
+    """
+    TopoJSON topology with the polygons of a GeoJSON FeatureCollection,
+    simplified with `tolerance` in coordinates units and quantized to
+    `quantization` distinct values on each axis.
+    """
+    features = [
+        feature
+        for feature in collection["features"]
+        if filter is None or filter(feature)
+    ]
+    shapes = [get_polygons(feature["geometry"]) for feature in features]
+    rings = [
+        ring for polygons in shapes for polygon in polygons for ring in polygon
+    ]
+    junctions = get_junctions(rings)
+
+    topology = Topology(quantization)
+    closed = set()
+    geometries = []
+    for feature, polygons in zip(features, shapes):
+        arcs = []
+        for polygon in polygons:
+            polygon_arcs = []
+            for ring in polygon:
+                ring_arcs = []
+                for arc in cut(ring, junctions):
+                    index = topology.add_arc(arc)
+                    if arc[0] == arc[-1]:
+                        closed.add(index if index >= 0 else ~index)
+                    ring_arcs.append(index)
+                polygon_arcs.append(ring_arcs)
+            arcs.append(polygon_arcs)
+        geometry = {"properties": feature.get("properties") or {}}
+        if len(arcs) == 1:
+            geometry.update(type="Polygon", arcs=arcs[0])
+        else:
+            geometry.update(type="MultiPolygon", arcs=arcs)
+        geometries.append(geometry)
+
+    topology.simplify(tolerance, closed)
+    transform, arcs = topology.encode()
+    return {
+        "type": "Topology",
+        "transform": transform,
+        "objects": {
+            name: {"type": "GeometryCollection", "geometries": geometries}
+        },
+        "arcs": arcs,
+    }
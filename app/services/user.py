@@ -1,28 +1,188 @@
-from datetime import UTC, datetime
+import atexit
+import logging
+import threading
+import time
+from datetime import UTC, datetime, timedelta
 
 import flask_login
 import sqlalchemy as sa
+import sqlalchemy.orm as orm
 import werkzeug.security
 from flask_login import current_user
 
-from app import app
-from app.db import User
+from app import app, config
+from app.db import Session, User
+
+
+class UserCache:
+    """
+    Column values of recently loaded users, shared between requests for `ttl`
+    seconds. Entries are dropped when a session commits changes to the user.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.entries: dict[int, tuple[float, dict]] = {}
+        # Incremented on each invalidation, so that a user loaded before it is
+        # not cached afterwards
+        self.generation = 0
+
+    def get(self, id: int) -> User | None:
+        entry = self.entries.get(id)
+        if not entry:
+            return None
+        expires, values = entry
+        if expires < time.monotonic():
+            self.entries.pop(id, None)
+            return None
+        user = User(**values)
+        orm.make_transient_to_detached(user)
+        return user
+
+    def set(self, user: User, generation: int):
+        if not self.ttl or generation != self.generation:
+            return
+        values = {
+            attr.key: getattr(user, attr.key)
+            for attr in sa.inspect(User).column_attrs
+        }
+        self.entries[user.id] = (time.monotonic() + self.ttl, values)
+
+    def invalidate(self, *ids: int):
+        self.generation += 1
+        for id in ids:
+            self.entries.pop(id, None)
+
+
+cache = UserCache(ttl=config.USER_CACHE_TTL)
+
+
+@sa.event.listens_for(Session, "after_flush")
+def _collect_modified_users(session, flush_context):
+    session.info.setdefault("modified_users", set()).update(
+        instance.id
+        for instance in (*session.dirty, *session.deleted)
+        if isinstance(instance, User)
+    )
+
+
+@sa.event.listens_for(Session, "after_commit")
+def _invalidate_modified_users(session):
+    if ids := session.info.pop("modified_users", None):
+        cache.invalidate(*ids)
+
+
+@sa.event.listens_for(Session, "after_rollback")
+def _forget_modified_users(session):
+    session.info.pop("modified_users", None)
+
+
+def get(id: int) -> User | None:
+    """
+    User by id. During a request, it is attached to the request session, so
+    that loading it again from there does not query the database. Values are
+    reused across requests for USER_CACHE_TTL seconds.
+    """
+    with app.session() as s:
+        key = s.identity_key(User, id)
+        if key in s.identity_map:
+            return s.identity_map[key]
+
+        if user := cache.get(id):
+            return s.merge(user, load=False)
+
+        generation = cache.generation
+        if user := s.get(User, id):
+            cache.set(user, generation)
+        return user
 
 
 @app.login_manager.user_loader
 def user_loader(id) -> User:
-    with app.session() as s:
-        return s.query(User).get(id)
+    return get(int(id))
+
+
+class LastSeenTracker:
+    """
+    Records users last seen times in memory and writes them in batches from a
+    background thread, instead of committing on every request.
+    """
+
+    def __init__(self, interval: float, granularity: float):
+        self.interval = interval
+        self.granularity = timedelta(seconds=granularity)
+        self.pending: dict[int, datetime] = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def seen(self, user: User):
+        now = datetime.now(UTC)
+        stored = user.last_seen
+        if stored and not stored.tzinfo:
+            stored = stored.replace(tzinfo=UTC)
+        if stored and now - stored < self.granularity:
+            return
+
+        with self.lock:
+            self.pending[user.id] = now
+            if self.thread is None and self.interval:
+                self.thread = threading.Thread(
+                    target=self.run, name="last-seen", daemon=True
+                )
+                self.thread.start()
+                atexit.register(self.flush)
+        if not self.interval:
+            self.flush()
+
+    def flush(self) -> int:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        try:
+            with app.session() as s:
+                # Core statement, users deleted meanwhile are skipped instead
+                # of failing the whole batch
+                table = User.__table__
+                s.execute(
+                    sa.update(table)
+                    .where(table.c.id == sa.bindparam("user_id"))
+                    .values(last_seen=sa.bindparam("last_seen")),
+                    [
+                        {"user_id": id, "last_seen": last_seen}
+                        for id, last_seen in pending.items()
+                    ],
+                )
+                s.commit()
+        except Exception:
+            # Retry with the next batch, keeping times recorded meanwhile
+            with self.lock:
+                for id, last_seen in pending.items():
+                    if self.pending.get(id, last_seen) <= last_seen:
+                        self.pending[id] = last_seen
+            raise
+        return len(pending)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Could not save users last seen times")
+
+
+last_seen = LastSeenTracker(
+    interval=config.LAST_SEEN_FLUSH_INTERVAL,
+    granularity=config.LAST_SEEN_GRANULARITY,
+)
 
 
 @app.before_request
 def update_last_seen():
     if not current_user.is_authenticated:
         return
-    with app.session() as s:
-        user = s.query(User).get(current_user.id)
-        user.last_seen = datetime.now(UTC)
-        s.commit()
+    last_seen.seen(current_user)
 
 
 def login(user: User) -> User:
@@ -1,8 +1,9 @@
 from dataclasses import dataclass
 
-import requests
 from bs4 import BeautifulSoup
 
+from app.services.http_client import client
+
 
 @dataclass
 class Arcade:
@@ -32,7 +33,7 @@ class Arcade:
 
 def get_arcade(id: int) -> Arcade:
     url = f"https://zenius-i-vanisher.com/v5.2/arcade.php?id={id}"
-    response = requests.get(url)
+    response = client.get(url)
     soup = BeautifulSoup(response.content, "html.parser")
 
     arcade_name = soup.find("h1").text
@@ -173,16 +173,98 @@ function createMap(regions, items) {
             }
     }).addTo(map);
 
-    async function loadRegions() {
-        const response = await fetch(regions);
-        const data = await response.json();
+    // Files with more detailed borders are used when zooming in
+    const regionsData = new Map();
+    let regionsUrl = null;
 
-        // remove Droms
-        data.features = data.features.filter((feature) => feature.properties.dep < 900);
+    async function loadRegions() {
+        const zoom = map.getZoom();
+        const level = regions
+            .filter((level) => level.min_zoom <= zoom)
+            .at(-1);
+        if (!level || level.url === regionsUrl)
+            return;
+        regionsUrl = level.url;
 
-        region.addData(data);
+        if (!regionsData.has(level.url)) {
+            const response = await fetch(level.url);
+            regionsData.set(level.url, await response.json());
+        }
+        if (regionsUrl !== level.url)
+            return;
+        region.clearLayers();
+        region.addData(regionsData.get(level.url));
     }
+    map.on('zoomend', loadRegions);
     loadRegions();
 
     return map;
 }
+
+const REGIONS_MAX_ZOOM = 5;
+
+function groupIcon(group) {
+    const avatars = group.avatars
+        .map((url) => `<img src="${url}" alt="">`)
+        .join("");
+    return L.divIcon({
+        className: "group-marker",
+        html: `<span class="avatars">${avatars}</span><span class="count">${group.count}</span>`,
+        iconSize: null,
+    });
+}
+
+async function fetchJSON(url) {
+    const response = await fetch(url);
+    return await response.json();
+}
+
+// Markers per region when zoomed out and per map point otherwise, the users
+// of a point are only fetched when opening its popup.
+async function createGroupsMap(regions, groupsUrls, pointUrl) {
+    const map = createMap(regions, []);
+    const [points, regionsGroups] = await Promise.all([
+        fetchJSON(groupsUrls.points),
+        fetchJSON(groupsUrls.regions),
+    ]);
+
+    const pointsLayer = L.layerGroup();
+    for (const group of points.groups) {
+        const marker = L.marker(
+            [group.latitude, group.longitude],
+            {icon: groupIcon(group)},
+        );
+        marker.bindPopup(`${group.name} (${group.count})`);
+        marker.on("popupopen", async () => {
+            const point = await fetchJSON(pointUrl(group.points[0]));
+            const users = point.users
+                .map((user) => `<a href="${user.link}">${user.name}</a>`)
+                .join("<br>");
+            marker.setPopupContent(`<strong>${point.name}</strong><br>${users}`);
+        });
+        pointsLayer.addLayer(marker);
+    }
+
+    const regionsLayer = L.layerGroup();
+    for (const group of regionsGroups.groups) {
+        const marker = L.marker(
+            [group.latitude, group.longitude],
+            {icon: groupIcon(group)},
+        );
+        marker.bindPopup(`${group.name} (${group.count})`);
+        regionsLayer.addLayer(marker);
+    }
+
+    function update() {
+        const zoomedOut = map.getZoom() <= REGIONS_MAX_ZOOM;
+        const [shown, hidden] = zoomedOut
+            ? [regionsLayer, pointsLayer]
+            : [pointsLayer, regionsLayer];
+        hidden.remove();
+        shown.addTo(map);
+    }
+    map.on("zoomend", update);
+    update();
+
+    return map;
+}
@@ -1,3 +1,5 @@
+import logging
+
 from app import app
 from app.services import audit
 from app.services import discord as service
@@ -26,3 +28,11 @@ def import_games_lists():
     users = service.import_games_lists()
     if users:
         audit.log("Task imported Discord games lists", users=users)
+
+
+@app.scheduler.task("interval", hours=1)
+@descript_task
+def log_rate_limits():
+    stats = service.pop_rate_limit_stats()
+    if stats.requests:
+        logging.info(f"Discord API: {stats}")
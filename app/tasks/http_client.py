@@ -0,0 +1,9 @@
+from app import app
+from app.services import http_client as service
+from app.tasks import descript_task
+
+
+@app.scheduler.task("interval", hours=1)
+@descript_task
+def log_http_metrics():
+    service.log_metrics()
@@ -0,0 +1,13 @@
+import logging
+
+from app import app
+from app.services import sessions as service
+from app.tasks import descript_task
+
+
+@app.scheduler.task("interval", hours=1)
+@descript_task
+def prune_sessions():
+    count = service.prune()
+    if count:
+        logging.info(f"Task deleted {count} expired sessions")
@@ -0,0 +1,30 @@
+from datetime import UTC, datetime, timedelta
+from unittest import mock
+
+from app import dates
+
+# 59 seconds into a minute
+NOW = datetime(2025, 1, 1, 12, 0, 59, tzinfo=UTC)
+
+
+def humanize(value: datetime) -> str:
+    with mock.patch("time.time", return_value=NOW.timestamp()):
+        return dates.humanize(value, locale="fr")
+
+
+def test_humanize_now():
+    assert humanize(NOW) == "maintenant"
+
+
+def test_humanize_seconds_ago():
+    assert humanize(NOW - timedelta(seconds=30)) == "il y a 30 secondes"
+    assert humanize(NOW - timedelta(seconds=40)) == "il y a 40 secondes"
+
+
+def test_humanize_in_previous_minute():
+    assert humanize(NOW - timedelta(seconds=70)) == "il y a une minute"
+
+
+def test_humanize_past_and_future():
+    assert humanize(NOW - timedelta(hours=3, minutes=30)) == "il y a 3 heures"
+    assert humanize(NOW + timedelta(days=2)) == "dans 2 jours"